@@ -0,0 +1,142 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import make_static_site as site
+from synthetic_data import generate_records
+
+# Stage-level benchmarks on synthetic data. Each stage is timed on its own, then
+# re-run under tracemalloc for its peak allocation (numpy and pandas buffers included),
+# so the timings are not skewed by allocation tracing. Results go to a JSON file;
+# pass --baseline with an earlier file to see the per-stage change.
+
+DEFAULT_SIZES = [100_000, 1_000_000, 10_000_000]
+
+def stage_functions(raw):
+    # Each stage consumes the previous stage's output, mirroring generate_static_site()
+    state = {}
+    def clean(): state['cleaned'] = site.clean_data(raw)
+    def aggregate(): state['metrics'] = site.build_dashboard_data(state['cleaned'])
+    def scenarios(): state['scenarios'] = site.compute_scenario_grid(state['cleaned'], list(state['metrics'][0]))
+    def serialize(): state['payload'] = site.dump_compact(site.encode_payload(state['metrics'][0], state['scenarios']))
+    def render(): state['html'] = site.render_site(state['metrics'][0], state['scenarios'])
+    return state, [('clean', clean), ('aggregate', aggregate), ('scenarios', scenarios),
+                   ('serialize', serialize), ('render', render)]
+
+def run_quietly(func):
+    # The pipeline narrates every step; keep the benchmark output to the results table
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+
+def time_stage(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_quietly(func)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def peak_alloc_mb(func):
+    tracemalloc.start()
+    try:
+        run_quietly(func)
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+def benchmark_size(n_rows, args):
+    start = time.perf_counter()
+    raw = generate_records(n_rows, args.seed)
+    print(f"\n🧪 {n_rows:,} rows (generated in {time.perf_counter() - start:.1f}s)")
+    state, stages = stage_functions(raw)
+    results = []
+    for name, func in stages:
+        seconds = time_stage(func, args.repeat)
+        peak = peak_alloc_mb(func) if args.memory else None
+        result = {"rows": n_rows, "stage": name, "seconds": round(seconds, 4),
+                  "peak_alloc_mb": None if peak is None else round(peak, 1)}
+        if name == 'clean': result["output_rows"] = len(state['cleaned'])
+        if name == 'serialize': result["output_bytes"] = len(state['payload'].encode("utf-8"))
+        if name == 'render': result["output_bytes"] = len(state['html'].encode("utf-8"))
+        results.append(result)
+        memory = "" if peak is None else f", peak {peak:,.0f} MB"
+        print(f"   {name:<10} {seconds:8.3f}s{memory}")
+    return results
+
+def benchmark_ingest(args):
+    # Throughput of the real fetch path against a datastore endpoint, normally fake_ckan_server.py
+    state = {}
+    def ingest(): state['raw'] = site.fetch_dataset(args.api_url, args.concurrency, args.page_limit)
+    seconds = time_stage(ingest, args.repeat)
+    rows = len(state['raw'])
+    print(f"\n🌐 ingest {rows:,} rows from {args.api_url}: {seconds:.3f}s ({rows / seconds:,.0f} rows/s)")
+    return [{"rows": rows, "stage": "ingest", "seconds": round(seconds, 4), "peak_alloc_mb": None,
+             "rows_per_second": round(rows / seconds), "concurrency": args.concurrency, "page_limit": args.page_limit}]
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_to_baseline(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["rows"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"\n📊 Change vs {baseline_path}")
+    for r in results:
+        old = baseline.get((r["rows"], r["stage"]))
+        if not old or not old["seconds"]: continue
+        print(f"   {r['rows']:>11,} {r['stage']:<10} {old['seconds']:8.3f}s -> {r['seconds']:8.3f}s "
+              f"({r['seconds'] / old['seconds'] - 1:+.0%})")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard build stages on synthetic data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="dataset sizes to benchmark")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="timed runs per stage; the fastest is reported")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the tracemalloc pass (halves the run time)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic records")
+    parser.add_argument("--output", default=os.path.join(site.CACHE_DIR, "benchmark_results.json"),
+                        help="where to write the results (default: inside the git-ignored cache dir)")
+    parser.add_argument("--api-url",
+                        help="also benchmark ingestion from this datastore_search endpoint (see fake_ckan_server.py)")
+    parser.add_argument("--concurrency", type=int, default=site.FETCH_CONCURRENCY, help="parallel requests for --api-url")
+    parser.add_argument("--page-limit", type=int, default=site.PAGE_LIMIT, help="rows per page for --api-url")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    return parser.parse_args(argv)
+
+def main(args):
+    results = benchmark_ingest(args) if args.api_url else []
+    for n_rows in args.rows:
+        results.extend(benchmark_size(n_rows, args))
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+    if args.baseline: compare_to_baseline(results, args.baseline)
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,159 @@
+import argparse
+import json
+import random
+import signal
+import threading
+import time
+import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from make_static_site import API_RESOURCE_ID, CURRENT_YEAR
+from synthetic_data import generate_records
+
+# A local stand-in for data.gov.il's CKAN datastore, serving synthetic records so
+# ingestion can be benchmarked and its failure handling exercised without a network:
+#
+#   python fake_ckan_server.py --rows 1000000 --latency 0.2 --error-rate 0.05
+#   python make_static_site.py --no-cache --api-url http://127.0.0.1:8765/api/3/action/datastore_search
+#
+# Implements datastore_search (limit/offset/sort on _id, total, fields, success flag)
+# and resource_show (last_modified). Failures are injected per request from a seeded
+# RNG: HTTP 5xx responses, hung requests that outlast the client timeout, and
+# success=false bodies.
+
+class FakeDatastore:
+    def __init__(self, args):
+        self.args = args
+        self.records = generate_records(args.rows, args.seed)
+        self.fields = [{"id": c, "type": "int" if c == "_id" else "text"} for c in self.records.columns]
+        self.last_modified = datetime.datetime(CURRENT_YEAR, 1, 1).isoformat()
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "rows_served": 0, "bytes_served": 0, "errors": 0, "timeouts": 0, "unsuccessful": 0}
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def draw_fault(self):
+        # One draw per request, so a given seed replays the same fault sequence
+        with self.lock:
+            roll = self.rng.random()
+        a = self.args
+        if roll < a.error_rate: return "error"
+        if roll < a.error_rate + a.timeout_rate: return "timeout"
+        if roll < a.error_rate + a.timeout_rate + a.unsuccessful_rate: return "unsuccessful"
+        return None
+
+    def search(self, params):
+        if params.get("resource_id") != API_RESOURCE_ID:
+            return 404, {"success": False, "error": {"message": "Not found: Resource was not found.", "__type": "Not Found Error"}}
+        try:
+            limit = min(int(params.get("limit", 100)), self.args.max_limit)
+            offset = int(params.get("offset", 0))
+        except ValueError:
+            return 409, {"success": False, "error": {"message": "Invalid limit/offset", "__type": "Validation Error"}}
+        records = self.records
+        if params.get("sort", "").replace(" ", "").lower() == "_iddesc":
+            records = records.iloc[::-1]
+        page = records.iloc[offset:offset + limit]
+        self.count("rows_served", len(page))
+        return 200, {"success": True, "result": {
+            "resource_id": API_RESOURCE_ID, "fields": self.fields, "limit": limit, "offset": offset,
+            "total": len(records), "records": page.to_dict("records"),
+        }}
+
+    def resource_show(self, params):
+        if params.get("id") != API_RESOURCE_ID:
+            return 404, {"success": False, "error": {"message": "Not found", "__type": "Not Found Error"}}
+        return 200, {"success": True, "result": {"id": API_RESOURCE_ID, "last_modified": self.last_modified,
+                                                 "datastore_active": True}}
+
+def make_handler(store):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            if store.args.verbose: super().log_message(*args)
+
+        def do_GET(self):
+            store.count("requests")
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if store.args.latency: time.sleep(store.args.latency)
+
+            fault = store.draw_fault()
+            if fault == "timeout":
+                store.count("timeouts")
+                time.sleep(store.args.hang_seconds)
+                self.close_connection = True
+                return
+            if fault == "error":
+                store.count("errors")
+                return self.send_json(store.rng.choice([500, 502, 503, 504]), {"success": False})
+
+            action = url.path.rsplit("/", 1)[-1]
+            if action == "datastore_search": status, body = store.search(params)
+            elif action == "resource_show": status, body = store.resource_show(params)
+            else: status, body = 404, {"success": False, "error": {"message": f"Unknown action {action}"}}
+            if fault == "unsuccessful" and status == 200:
+                store.count("unsuccessful")
+                body = {"success": False, "error": {"message": "Injected failure", "__type": "Internal Error"}}
+            self.send_json(status, body)
+
+        def send_json(self, status, body):
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            store.count("bytes_served", len(payload))
+            bandwidth = store.args.bandwidth_kbps * 1024
+            if not bandwidth:
+                self.wfile.write(payload)
+                return
+            # Throttle by writing ~50ms worth of bytes at a time
+            chunk = max(1, int(bandwidth / 20))
+            for start in range(0, len(payload), chunk):
+                self.wfile.write(payload[start:start + chunk])
+                time.sleep(len(payload[start:start + chunk]) / bandwidth)
+
+    return Handler
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic records through a fake CKAN datastore API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic records to serve")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the records and the injected faults")
+    parser.add_argument("--max-limit", type=int, default=32000, help="largest page the server returns (CKAN caps limit)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added before every response")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0.0, help="per-connection bandwidth cap in KB/s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 5xx")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests that hang and then drop")
+    parser.add_argument("--hang-seconds", type=float, default=60.0,
+                        help="how long a hung request stalls (above the client's REQUEST_TIMEOUT to force a timeout)")
+    parser.add_argument("--unsuccessful-rate", type=float, default=0.0, help="share of requests answered with success=false")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+def stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(args):
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    store = FakeDatastore(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(store))
+    server.daemon_threads = True
+    print(f"🧪 Serving {len(store.records):,} synthetic records on http://{args.host}:{args.port}/api/3/action/datastore_search")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n📊 {json.dumps(store.stats)}")
+
+if __name__ == "__main__":
+    serve(parse_args())
@@ -1,13 +1,76 @@
-import pandas as pd
 import json
 import datetime
-import plotly.utils
-import numpy as np
-import requests
 import os
+import argparse
+import sys
+import glob
+import hashlib
+import inspect
+import re
+import gzip
+import importlib.util
+import functools
+import contextlib
+import threading
+import time
+import cProfile
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, unquote
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+try:
+    import brotli
+except ImportError:  # only --production needs it, for the .br siblings
+    brotli = None
+
+def lazy_import(name):
+    # The module is only executed on first attribute access, so a run that never touches
+    # it (--render-from, --help) never pays for the import
+    if name in sys.modules: return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+pa = lazy_import("pyarrow")
+requests = lazy_import("requests")
 
 # --- CONFIGURATION ---
 API_RESOURCE_ID = "9c64c522-bbc2-48fe-96fb-3b2a8626f59e"
+API_URL = "https://data.gov.il/api/3/action/datastore_search"
+PAGE_LIMIT = 32000
+REQUEST_TIMEOUT = 45
+FETCH_CONCURRENCY = 4
+FETCH_RETRIES = 3
+CACHE_DIR = ".cache"
+SNAPSHOT_FILE = "raw_snapshot.parquet"
+SNAPSHOT_META_FILE = "raw_snapshot.json"
+STAGES_DIR = "stages"
+PIPELINE_STAGES = ['raw', 'cleaned', 'metrics', 'site']
+STAGE_EXTENSIONS = {'cleaned': 'arrow', 'metrics': 'json'}
+RUN_REPORT_FILE = "run_report.json"
+RENDER_INPUT_FILE = "metrics.json"
+HISTORY_DIR = "history"
+SHARD_DIR = "data"
+ASSETS_DIR = "assets"
+# Trace types the page template draws; a vendored bundle must register exactly these
+PLOTLY_TRACE_TYPES = ('scatter', 'bar', 'pie')
+# Pinned partial plotly.js build holding only those traces. A copy committed under
+# VENDOR_DIR is used as-is (air-gapped builds); otherwise it is downloaded once into
+# <cache-dir>/vendor/, never under --offline
+PLOTLY_VERSION = "2.35.2"
+PLOTLY_BUNDLE_URL = f"https://cdn.plot.ly/plotly-basic-{PLOTLY_VERSION}.min.js"
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vendor")
+PAGE_SIZE_BUDGET_KB = 300
+ASSET_SIZE_BUDGET_KB = 1200  # plotly-basic 2.35.2 is about 1 MB minified
+SHARD_SIZE_BUDGET_KB = 100
 ISRAEL_POPULATION = 10_170_000
 RETIREMENT_AGE_EXPERIENCE = 45
 CURRENT_YEAR = datetime.datetime.now().year
@@ -156,159 +219,543 @@ US_MAPPING = {
     'כירורגית כלי דם': 'Vascular Surgery'
 }
 
-def get_year_simple(val):
-    s = str(val).strip()
-    if s.endswith('.0'): s = s[:-2]
-    if not s or s.lower() in ['nan', 'none', '', 'nat']:
-        return np.nan
-    if len(s) >= 4:
-        potential_year = s[-4:]
-        if potential_year.isdigit():
-            y = int(potential_year)
-            if 1900 <= y <= CURRENT_YEAR + 1:
-                return y
-    return np.nan
-
-def load_and_clean_data():
-    print("⏳ Connecting to data.gov.il API...")
-    api_url = "https://data.gov.il/api/3/action/datastore_search"
-    limit = 32000 
-    offset = 0
-    all_records = []
-    
-    while True:
-        params = {"resource_id": API_RESOURCE_ID, "limit": limit, "offset": offset}
+# API column names (they vary between dataset versions) -> internal names
+COLUMN_MAP = {
+    'שם פרטי': 'first_name', 'שם משפחה': 'last_name',
+    'מספר רישיון': 'license_num', 'מספר רשיון': 'license_num', 'mispar_rishyon': 'license_num',
+    'תאריך רישום רישיון': 'license_date_raw', 'תאריך רישיון': 'license_date_raw',
+    'שם התמחות': 'specialty_name', 'תאור מומחיות': 'specialty_name',
+    'תאריך רישום התמחות': 'spec_date_raw'
+}
+
+# Columns the cleaned frame keeps after the rename (everything else is dropped)
+CLEAN_COLUMNS = ['license_num', 'license_date_raw', 'specialty_name', 'spec_date_raw']
+
+# Spelling variants of the same specialty -> canonical name, kept in a versioned data
+# file next to this script (bump its "version" on every edit)
+NORMALIZATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "specialty_normalization.json")
+# Dash, quote and invisible bidi/zero-width variants folded before a name is looked up
+SPELLING_TRANSLATION = str.maketrans({
+    **dict.fromkeys('\u05be\u2010\u2011\u2012\u2013\u2014\u2015\u2212', '-'),
+    **dict.fromkeys('\u05f4\u201c\u201d\u201e\u201f\u2033', '"'),
+    **dict.fromkeys('\u05f3\u2018\u2019\u201a\u201b\u2032`\u00b4', "'"),
+    **dict.fromkeys('\u200b\u200c\u200d\u200e\u200f\u202a\u202b\u202c\u202d\u202e\u2066\u2067\u2068\u2069\ufeff'),
+})
+
+# Experience pie bins (years since specialty registration)
+EXPERIENCE_BINS = [0, 10, 25, 120]
+EXPERIENCE_LABELS = ['Juniors (0-10y)', 'Mid (10-25y)', 'Seniors (25-45y)']
+PIE_COLUMNS = ['pie_juniors', 'pie_mid', 'pie_seniors']
+MIN_ACTIVE_DOCTORS = 30
+# Net pipeline trend: rolling window and horizon
+HISTORY_START_YEAR = 1980
+TREND_WINDOW_YEARS = 8
+FORECAST_YEARS = 4
+# Replacement ratio: juniors (experience <= 10y) over veterans (>= 30y)
+JUNIOR_MAX_EXPERIENCE = 10
+VETERAN_MIN_EXPERIENCE = 30
+# What-if grid the page's sliders switch between; each list must contain the default above it
+SCENARIO_GRID = {
+    'retire': [35, 40, RETIREMENT_AGE_EXPERIENCE, 50],
+    'junior': [5, JUNIOR_MAX_EXPERIENCE, 15],
+    'veteran': [25, VETERAN_MIN_EXPERIENCE, 35],
+    'window': [5, TREND_WINDOW_YEARS, 10],
+    'population': [9_500_000, ISRAEL_POPULATION, 11_000_000, 12_000_000],
+}
+SCENARIO_DEFAULTS = {'retire': RETIREMENT_AGE_EXPERIENCE, 'junior': JUNIOR_MAX_EXPERIENCE,
+                     'veteran': VETERAN_MIN_EXPERIENCE, 'window': TREND_WINDOW_YEARS, 'population': ISRAEL_POPULATION}
+RATIO_COLORS = ["#e74c3c", "#f39c12", "#27ae60"]
+GAP_COLORS = ["#e74c3c", "#27ae60"]
+# Per-specialty KPIs appended to the history store on every build; the chart plots
+# the newest HISTORY_CHART_DATES as-of times of a subset, rounded to these digits
+HISTORY_KPIS = ['total_active', 'replacement_ratio', 'net_now', 'velocity', 'density', 'count_over_45']
+HISTORY_CHART_KPIS = {'total_active': 0, 'replacement_ratio': 2}
+HISTORY_CHART_DATES = 365
+# A cleaned record's identity in the history store, and the fields whose changes are recorded
+RECORD_KEY = ['license_num', 'specialty_name']
+RECORD_VALUES = ['gen_year', 'spec_year']
+
+def extract_years(values):
+    # Year = the value's last four digits after a strip and one trailing '.0' is dropped,
+    # kept when within 1900..CURRENT_YEAR+1 (nan/none/nat tokens never end in four digits);
+    # tests/test_extract_years.py pins it to the original per-value get_year_simple().
+    # Dates repeat heavily, so the regex pass runs over the distinct values only and
+    # the result is broadcast back through the factorize codes.
+    codes, uniques = pd.factorize(values)
+    s = pd.Series(uniques, dtype=object).astype(str).str.strip().str.replace(r'\.0\Z', '', regex=True)
+    digits = s.str.extract(r'(\d{4})\Z', expand=False)
+    years = pd.to_numeric(digits, errors='coerce')
+    # \d also matches non-ASCII decimal digits, which int() accepts but to_numeric does not
+    missed = years.isna() & digits.notna()
+    if missed.any(): years[missed] = digits[missed].map(int)
+    years = years.where((years >= 1900) & (years <= CURRENT_YEAR + 1)).to_numpy(dtype=float)
+    out = np.full(len(codes), np.nan)
+    out[codes >= 0] = years[codes[codes >= 0]]
+    return pd.Series(out, index=values.index)
+
+def make_session(concurrency=FETCH_CONCURRENCY, retries=FETCH_RETRIES, stats=None):
+    # One pooled keep-alive session shared by every page request. Transient 5xx
+    # responses, dropped connections and read timeouts are retried with backoff.
+    session = requests.Session()
+    if stats is not None:
+        # Tally bytes and datastore pages into `stats` (a run-report entry); pages arrive on pool threads
+        stats.update(bytes_fetched=stats.get('bytes_fetched', 0), pages_fetched=stats.get('pages_fetched', 0))
+        lock = threading.Lock()
+        def count_response(r, *args, **kwargs):
+            with lock:
+                stats['bytes_fetched'] += len(r.content)
+                if 'datastore_search' in r.url: stats['pages_fetched'] += 1
+        session.hooks['response'].append(count_response)
+    retry = requests.adapters.Retry(total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                                    allowed_methods=("GET",), raise_on_status=False)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, concurrency), max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def fetch_page(session, api_url, offset, limit=PAGE_LIMIT, sort=None):
+    params = {"resource_id": API_RESOURCE_ID, "limit": limit, "offset": offset}
+    if sort: params["sort"] = sort
+    r = session.get(api_url, params=params, timeout=REQUEST_TIMEOUT)
+    r.raise_for_status()
+    data = r.json()
+    if not data.get('success'): return None
+    return data['result']
+
+def fetch_resource_meta(session, api_url):
+    # Cheap change probe: resource_show for last_modified, a zero-row search for the total
+    try:
+        show_url = api_url.rsplit('/', 1)[0] + "/resource_show"
+        r = session.get(show_url, params={"id": API_RESOURCE_ID}, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        resource = r.json().get('result') or {}
+        page = fetch_page(session, api_url, 0, 0)
+        return {
+            "last_modified": resource.get('last_modified') or resource.get('metadata_modified'),
+            "total": page.get('total') if page else None,
+            "fields": [f['id'] for f in page.get('fields', [])] if page else None,
+        }
+    except Exception as e:
+        print(f"⚠️ Could not read resource metadata: {e}")
+        return None
+
+def kept_columns(page):
+    # Only the columns COLUMN_MAP knows about (plus _id for incremental runs) are ever buffered
+    names = [f['id'] for f in page.get('fields', [])] or list(page['records'][0].keys())
+    return [c for c in names if c in COLUMN_MAP or c == '_id']
+
+def page_to_batch(records, columns):
+    # API values arrive as a mix of str/int/None; text columns are stored uniformly
+    # as strings so every page shares one schema and the snapshot round-trips
+    arrays = []
+    for col in columns:
+        values = [r.get(col) for r in records]
+        if col == '_id':
+            arrays.append(pa.array(values, type=pa.int64()))
+        else:
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+def fetch_batch(session, api_url, offset, limit, sort, columns, total):
+    # Shared by both walks: a failed page always raises, and an empty page is only the
+    # end of the data when the total is unknown
+    page = fetch_page(session, api_url, offset, limit, sort)
+    if page is None: raise RuntimeError(f"page at offset {offset} came back unsuccessful")
+    if not page['records']:
+        if total is None: return None
+        raise RuntimeError(f"page at offset {offset} came back empty below the total of {total}")
+    return page_to_batch(page['records'], columns)
+
+def fetch_dataset(api_url=API_URL, concurrency=FETCH_CONCURRENCY, limit=PAGE_LIMIT, session=None,
+                  start_offset=0, sort=None):
+    own_session = session is None
+    if own_session: session = make_session(concurrency)
+    batches = []
+    try:
+        first = fetch_page(session, api_url, start_offset, limit, sort)
+        if first is None: raise RuntimeError(f"page at offset {start_offset} came back unsuccessful")
+        total = first.get('total')
+        if not first['records']:
+            if total is not None and total > start_offset:
+                raise RuntimeError(f"page at offset {start_offset} came back empty below the total of {total}")
+            return pd.DataFrame()
+        columns = kept_columns(first)
+        batches.append(page_to_batch(first['records'], columns))
+        rows = batches[0].num_rows
+        print(f"   Fetched {rows} rows...", end='\r')
+        del first
+
+        if total is None or concurrency <= 1:
+            # Sequential walk: up to the total when it is known, else to the first short page
+            offset = start_offset + limit
+            while offset < total if total is not None else batches[-1].num_rows >= limit:
+                batch = fetch_batch(session, api_url, offset, limit, sort, columns, total)
+                if batch is None: break
+                batches.append(batch)
+                rows += batch.num_rows
+                offset += limit
+                print(f"   Fetched {rows} rows...", end='\r')
+        else:
+            # Total is known: fan the remaining offsets out over the pool. Workers turn
+            # their page into a record batch straight away, and pool.map yields in
+            # submission order, so batches stay in offset order.
+            offsets = range(start_offset + limit, total, limit)
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                pages = pool.map(lambda o: fetch_batch(session, api_url, o, limit, sort, columns, total), offsets)
+                for batch in pages:
+                    batches.append(batch)
+                    rows += batch.num_rows
+                    print(f"   Fetched {rows} rows...", end='\r')
+    finally:
+        if own_session: session.close()
+
+    # Short pages below the total mean rows went missing mid-walk, not the end of the data
+    if total is not None and start_offset + rows < total:
+        raise RuntimeError(f"fetched {rows} rows from offset {start_offset}, expected {total - start_offset}")
+
+    # One concatenation at the end instead of a growing list of row dicts
+    return pa.Table.from_batches(batches).to_pandas()
+
+def peak_rss_mb():
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def read_snapshot_meta(cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, SNAPSHOT_META_FILE)
+    if not os.path.exists(path) or not os.path.exists(os.path.join(cache_dir, SNAPSHOT_FILE)):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def snapshot_is_fresh(cached_meta, remote_meta):
+    if not cached_meta or not remote_meta: return False
+    if remote_meta.get('last_modified') is None or remote_meta.get('total') is None: return False
+    return (cached_meta.get('last_modified') == remote_meta['last_modified']
+            and cached_meta.get('total') == remote_meta['total'])
+
+def read_snapshot(cache_dir=CACHE_DIR):
+    df = pd.read_parquet(os.path.join(cache_dir, SNAPSHOT_FILE))
+    df.attrs['last_modified'] = (read_snapshot_meta(cache_dir) or {}).get('last_modified')
+    return df
+
+def write_snapshot(df, meta, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    df.to_parquet(os.path.join(cache_dir, SNAPSHOT_FILE), index=False, compression="zstd")
+    meta = dict(meta or {}, rows=len(df), fetched_at=datetime.datetime.now().isoformat(timespec="seconds"))
+    if '_id' in df.columns: meta['max_id'] = int(df['_id'].max())
+    tmp_path = os.path.join(cache_dir, SNAPSHOT_META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, SNAPSHOT_META_FILE))
+
+def incremental_fallback_reason(cached_meta, remote_meta):
+    if not cached_meta or cached_meta.get('max_id') is None: return "no incremental snapshot yet"
+    if not remote_meta or remote_meta.get('total') is None: return "upstream row count unknown"
+    if remote_meta['total'] < cached_meta.get('total', 0): return "upstream row count shrank"
+    if remote_meta['total'] == cached_meta.get('total'): return "rows changed in place"
+    if remote_meta.get('fields') != cached_meta.get('fields'): return "upstream schema changed"
+    return None
+
+def delta_offset_mismatch(session, api_url, cached_meta):
+    # The delta is fetched from offset cached total on the _id-sorted table, which is only
+    # right while count(_id <= cached max_id) upstream still equals the cached total. The
+    # row at offset total - 1 carries the cached max_id exactly when it does: after k
+    # deletions below it, that offset holds a newer row and the first k new rows would be skipped.
+    page = fetch_page(session, api_url, cached_meta['total'] - 1, 1, sort="_id asc")
+    if page is None or not page['records']: return "could not read the row at the cached offset"
+    found = page['records'][0].get('_id')
+    if found != cached_meta['max_id']:
+        return f"rows before _id {cached_meta['max_id']} were deleted or renumbered (offset holds _id {found})"
+    return None
+
+def fetch_delta(args, session, cached_meta):
+    # Rows are appended with increasing _id, so sorting on _id puts every
+    # new record past the offset we already hold (delta_offset_mismatch() checks that first).
+    print(f"⏳ Incremental: fetching rows past _id {cached_meta['max_id']}...")
+    delta = fetch_dataset(args.api_url, args.concurrency, args.page_limit, session,
+                          start_offset=cached_meta['total'], sort="_id asc")
+    if len(delta): delta = delta[delta['_id'] > cached_meta['max_id']]
+    print(f"\n   {len(delta)} new rows")
+    return pd.concat([read_snapshot(args.cache_dir), delta], ignore_index=True)
+
+def dedupe_records(df):
+    # One row per license + specialty; the most recently ingested record wins. Runs on
+    # full and incremental fetches alike, so both write the same snapshot, and records
+    # re-served past the cached _id do not pile up in it.
+    keys = [next((c for c in df.columns if COLUMN_MAP.get(c) == name), None)
+            for name in ('license_num', 'specialty_name')]
+    if None in keys: return df
+    return df.drop_duplicates(subset=keys, keep='last', ignore_index=True)
+
+def load_raw_data(args, stats=None):
+    cached_meta = read_snapshot_meta(args.cache_dir) if args.use_cache else None
+    if args.offline:
+        if cached_meta is None:
+            print(f"❌ Offline mode needs a cached snapshot in {args.cache_dir}/")
+            return None
+        print(f"📦 Offline: building from snapshot fetched {cached_meta.get('fetched_at')}")
+        return read_snapshot(args.cache_dir)
+
+    print(f"⏳ Connecting to data.gov.il API ({args.concurrency} parallel requests)...")
+    session = make_session(args.concurrency, args.retries, stats)
+    try:
+        remote_meta = fetch_resource_meta(session, args.api_url)
+        if snapshot_is_fresh(cached_meta, remote_meta):
+            print(f"📦 Dataset unchanged since {remote_meta['last_modified']}; using cached snapshot")
+            return read_snapshot(args.cache_dir)
+        reason = incremental_fallback_reason(cached_meta, remote_meta) if args.incremental else "incremental mode off"
         try:
-            r = requests.get(api_url, params=params, timeout=45)
-            r.raise_for_status()
-            data = r.json()
-            if not data.get('success'): break
-            records = data['result']['records']
-            if not records: break
-            all_records.extend(records)
-            offset += limit
-            print(f"   Fetched {len(all_records)} rows...", end='\r')
-            if len(records) < limit: break
+            if reason is None:
+                reason = delta_offset_mismatch(session, args.api_url, cached_meta)
+            if reason is None:
+                df = fetch_delta(args, session, cached_meta)
+            else:
+                if args.incremental: print(f"↻ Full refresh: {reason}")
+                df = fetch_dataset(args.api_url, args.concurrency, args.page_limit, session)
+            df = dedupe_records(df)
         except Exception as e:
             print(f"\n❌ Error fetching API: {e}")
             return None
+    finally:
+        session.close()
 
-    df = pd.DataFrame(all_records)
+    df.attrs['last_modified'] = (remote_meta or {}).get('last_modified')
+    if args.use_cache and len(df):
+        write_snapshot(df, remote_meta, args.cache_dir)
+    return df
+
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+def ingest_raw_data(args, stats=None):
+    rss_before = peak_rss_mb()
+    df = load_raw_data(args, stats)
+    if df is None: return None
+    rss_after = peak_rss_mb()
+    if rss_after is not None:
+        print(f"\n📈 Peak RSS: {rss_before:.0f} MB before ingestion, {rss_after:.0f} MB after")
     print(f"\n✅ Total Raw Records: {len(df)}")
-    
-    col_map = {
-        'שם פרטי': 'first_name', 'שם משפחה': 'last_name',
-        'מספר רישיון': 'license_num', 'מספר רשיון': 'license_num', 'mispar_rishyon': 'license_num',
-        'תאריך רישום רישיון': 'license_date_raw', 'תאריך רישיון': 'license_date_raw',
-        'שם התמחות': 'specialty_name', 'תאור מומחיות': 'specialty_name',
-        'תאריך רישום התמחות': 'spec_date_raw'
-    }
-    df = df.rename(columns=col_map)
-    
-    if 'first_name' in df.columns:
-        df['first_name'] = df['first_name'].astype(str).str.strip()
-        df['last_name'] = df['last_name'].astype(str).str.strip()
-        df['Name'] = df['first_name'] + " " + df['last_name']
+    return df
+
+def load_and_clean_data(args=None):
+    df = ingest_raw_data(args or parse_args([]))
+    return None if df is None else clean_data(df)
+
+def canonical_spelling(name):
+    # One spelling per name: folded dashes/quotes, no invisible marks, single spaces
+    return " ".join(name.translate(SPELLING_TRANSLATION).split())
+
+@functools.lru_cache(maxsize=4)
+def compile_normalization(path, mtime_ns):
+    # Compiled once per file version: lookups keyed by canonical spelling, and every
+    # canonical name maps to itself so mapping twice is a no-op
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    lookup = {canonical_spelling(k): canonical_spelling(v) for k, v in doc["variants"].items()}
+    for v in list(lookup.values()):
+        lookup.setdefault(v, v)
+    return {"version": doc["version"], "variants": doc["variants"], "lookup": lookup}
+
+def normalization_table(path=NORMALIZATION_FILE):
+    return compile_normalization(path, os.stat(path).st_mtime_ns)
+
+def normalize_specialties(values):
+    # Canonicalize and map each distinct spelling once, then broadcast back through the codes;
+    # the cost follows the number of distinct names rather than the row count
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
     else:
-        df['Name'] = "Unknown"
+        codes, uniques = pd.factorize(values)
+    lookup = normalization_table()["lookup"]
+    names = [lookup.get(n, n) for n in (canonical_spelling(str(u)) for u in uniques)]
+    # Missing names (code -1) land on a trailing 'nan', which the metrics drop with the other placeholders
+    missing = ['nan'] if (codes < 0).any() else []
+    mapped = pd.Categorical(np.array(names + missing, dtype=object))
+    return pd.Series(pd.Categorical.from_codes(mapped.codes[codes], categories=mapped.categories), index=values.index)
+
+def clean_data(df):
+    df = df.rename(columns=COLUMN_MAP)
+    mem_before = frame_memory_mb(df)
+    # Names only feed the license_num fallback, so they are kept only when it is needed
+    needed = CLEAN_COLUMNS if 'license_num' in df.columns else CLEAN_COLUMNS + ['first_name', 'last_name']
+    df = df[[c for c in needed if c in df.columns]]
 
     if 'license_num' not in df.columns:
-        df['license_num'] = df['Name'] + "_" + df['license_date_raw'].astype(str)
+        if 'first_name' in df.columns:
+            names = df['first_name'].astype(str).str.strip() + " " + df['last_name'].astype(str).str.strip()
+        else:
+            names = "Unknown"
+        df['license_num'] = names + "_" + df['license_date_raw'].astype(str)
+        df = df.drop(columns=['first_name', 'last_name'], errors='ignore')
 
     print("⏳ Extracting years...")
     if 'license_date_raw' in df.columns:
-        df['gen_year'] = df['license_date_raw'].apply(get_year_simple)
+        df['gen_year'] = extract_years(df['license_date_raw']).astype('Int16')
     else:
         print("❌ Critical: No license date column found.")
         return None
     
     if 'spec_date_raw' in df.columns:
-        df['spec_year'] = df['spec_date_raw'].apply(get_year_simple)
+        df['spec_year'] = extract_years(df['spec_date_raw']).astype('Int16')
     else:
-        df['spec_year'] = np.nan
+        df['spec_year'] = pd.Series(pd.NA, index=df.index, dtype='Int16')
 
-    df = df.dropna(subset=['gen_year'])
+    df = df.dropna(subset=['gen_year']).drop(columns=['license_date_raw', 'spec_date_raw'], errors='ignore')
 
     if 'specialty_name' not in df.columns: df['specialty_name'] = "Unknown"
-    df['specialty_name'] = df['specialty_name'].astype(str).str.strip()
-    
-    normalization_map = {
-        'מחלות אף אוזן וגרון': 'מחלות א.א.ג. וכירורגיית ראש-צוואר',
-        'כירורגית בית החזה - מסלול כירורגית לב': 'כירורגית לב',
-        'כירורגיה של בית החזה - מסלול לב מבוגרים': 'כירורגית לב',
-        'כירורגיה של בית החזה - מסלול לב ילדים': 'כירורגית לב ילדים',
-        'כירורגית בית החזה - מסלול כירורגית לב וכירורגית חזה כללית': 'כירורגית חזה ולב',
-        'כירורגית בית החזה - מסלול כירורגית חזה כללית': 'כירורגיה של בית החזה',
-        'נוירולוגיית ילדים': 'נוירולוגית ילדים והתפתחות הילד',
-        'רפואה דחופה - מסלול מבוגרים': 'רפואה דחופה',
-        'רפואת משפחה': 'רפואת המשפחה', 
-        'אורתופדיה': 'כירורגיה אורתופדית',
-        'עיניים': 'מחלות עיניים', 'רפואת עיניים': 'מחלות עיניים',
-        'אורולוגיה': 'כירורגיה אורולוגית', 
-        'עור ומין': 'דרמטולוגיה-מחלות עור ומין',
-        'כירורגיה פלסטית': 'כירורגיה פלסטית ואסתטית', 
-        'טיפול נמרץ': 'טיפול נמרץ כללי'
-    }
-    df['specialty_name'] = df['specialty_name'].replace(normalization_map)
+    df['specialty_name'] = normalize_specialties(df['specialty_name'])
 
     df['gen_experience'] = CURRENT_YEAR - df['gen_year']
     df['spec_experience'] = CURRENT_YEAR - df['spec_year']
     df['spec_experience'] = df['spec_experience'].fillna(df['gen_experience']) 
     df['retirement_year_spec'] = df['spec_year'].fillna(df['gen_year']) + RETIREMENT_AGE_EXPERIENCE
 
+    print(f"🧮 Frame memory: {mem_before:.1f} MB raw -> {frame_memory_mb(df):.1f} MB compact")
     return df
 
-def generate_static_site():
-    df = load_and_clean_data()
-    if df is None: return
+def first_occurrence(codes):
+    mask = np.zeros(len(codes), dtype=bool)
+    mask[np.unique(codes, return_index=True)[1]] = True
+    return mask
 
-    active_df_rows = df[df['gen_experience'] <= RETIREMENT_AGE_EXPERIENCE].copy()
-    unique_specialties = sorted([s for s in df['specialty_name'].unique() if s.lower() not in ['nan', 'none', '', 'unknown']])
-    
-    dashboard_data = {}
-    global_velocity_data = [] 
+def dedup_keys(df):
+    return df.groupby(['specialty_name', 'license_num'], observed=True, sort=False, dropna=False).ngroup().to_numpy()
 
-    print("⏳ Generating Dashboard...")
-    
-    for spec in unique_specialties:
-        spec_df_all = df[df['specialty_name'] == spec]
-        spec_df_active = active_df_rows[active_df_rows['specialty_name'] == spec]
-        
-        total_active = spec_df_active['license_num'].nunique()
-        if total_active < 30: continue 
+def dedup_masks(df):
+    # The (specialty, license_num) unique index is built once. Downstream code
+    # reads deduplicated rows through these masks instead of copied frames.
+    key_codes = dedup_keys(df)
+    active = (df['gen_experience'] <= RETIREMENT_AGE_EXPERIENCE).to_numpy(dtype=bool, na_value=False)
+    first = first_occurrence(key_codes)
+    # First *active* row of each key; inactive rows share a placeholder code and are masked out
+    first_active = active & first_occurrence(np.where(active, key_codes, -1))
+    return first, first_active
 
-        unique_active_docs = spec_df_active.drop_duplicates(subset='license_num')
-        spec_df_all_unique = spec_df_all.drop_duplicates(subset='license_num')
+def replacement_ratio(juniors, veterans):
+    # Juniors per veteran, 99.9 without veterans. Python's round() on every cell, not
+    # np.round(), which rounds half-way floats differently (1/40 -> 0.02, not 0.03): the
+    # page's scenario grid, the metrics artifact, the API and the history store all
+    # show this one value. round() runs over the distinct quotients only.
+    juniors, veterans = np.broadcast_arrays(np.asarray(juniors, dtype=float), np.asarray(veterans, dtype=float))
+    quotients, inverse = np.unique(juniors / np.maximum(veterans, 1), return_inverse=True)
+    rounded = np.array([round(float(q), 2) for q in quotients])[inverse].reshape(juniors.shape)
+    return np.where(veterans > 0, rounded, 99.9)
 
-        count_over_45 = len(spec_df_all_unique[spec_df_all_unique['gen_experience'] > 45])
+def ratio_color_index(ratio):
+    # Index into RATIO_COLORS: below 0.8 red, above 1.2 green, amber in between
+    return np.select([np.asarray(ratio) < 0.8, np.asarray(ratio) > 1.2], [0, 2], 1)
 
-        juniors_count = len(unique_active_docs[unique_active_docs['gen_experience'] <= 10])
-        veterans_count = len(unique_active_docs[unique_active_docs['gen_experience'] >= 30])
-        replacement_ratio = round(juniors_count / veterans_count, 2) if veterans_count > 0 else 99.9
-        
-        ratio_color = "#f39c12"
-        if replacement_ratio > 1.2: ratio_color = "#27ae60"
-        if replacement_ratio < 0.8: ratio_color = "#e74c3c"
+def compute_specialty_metrics(df, first, first_active):
+    # Every per-specialty KPI in one groupby pass over boolean flag columns; one row per specialty
+    exp = df['gen_experience'].to_numpy(dtype=float, na_value=np.nan)
+    spec_exp = df['spec_experience'].to_numpy(dtype=float, na_value=np.nan)
+    lo, mid, hi, top = EXPERIENCE_BINS
+    flags = pd.DataFrame({
+        'juniors': first_active & (exp <= JUNIOR_MAX_EXPERIENCE),
+        'veterans': first_active & (exp >= VETERAN_MIN_EXPERIENCE),
+        'outflow_now': first_active & (exp >= (RETIREMENT_AGE_EXPERIENCE - 10)),
+        'total_active': first_active & df['license_num'].notna().to_numpy(),
+        'count_over_45': first & (exp > 45),
+        # Same bins as pd.cut(..., right=False)
+        'pie_juniors': first_active & (spec_exp >= lo) & (spec_exp < mid),
+        'pie_mid': first_active & (spec_exp >= mid) & (spec_exp < hi),
+        'pie_seniors': first_active & (spec_exp >= hi) & (spec_exp < top),
+    }, index=df.index)
+    metrics = flags.groupby(df['specialty_name'], observed=True).sum().astype(int)
+    metrics.index = metrics.index.astype(object)
 
-        velocity = (juniors_count / total_active) * 100
-        outflow_now = len(unique_active_docs[unique_active_docs['gen_experience'] >= (RETIREMENT_AGE_EXPERIENCE - 10)])
-        net_now = juniors_count - outflow_now
-        
-        density = (total_active / ISRAEL_POPULATION) * 1000
-        usa_bench = AAMC_USA_BENCHMARKS.get(spec, None)
-        usa_text, usa_color = "No Benchmark", "#95a5a6"
-        if usa_bench:
-            gap = density - usa_bench
-            gap_docs = int(gap * (ISRAEL_POPULATION / 1000))
-            if gap < 0: usa_text, usa_color = f"Deficit: {gap_docs}", "#e74c3c"
-            else: usa_text, usa_color = f"Surplus: +{gap_docs}", "#27ae60"
+    valid = [s for s in metrics.index if str(s).lower() not in ['nan', 'none', '', 'unknown']]
+    metrics = metrics.loc[sorted(valid)]
+    metrics = metrics[metrics['total_active'] >= MIN_ACTIVE_DOCTORS]
+
+    metrics['replacement_ratio'] = replacement_ratio(metrics['juniors'], metrics['veterans']).tolist()
+    metrics['ratio_color'] = np.asarray(RATIO_COLORS)[ratio_color_index(metrics['replacement_ratio'])]
+    metrics['velocity'] = (metrics['juniors'] / metrics['total_active']) * 100
+    metrics['net_now'] = metrics['juniors'] - metrics['outflow_now']
+
+    metrics['density'] = (metrics['total_active'] / ISRAEL_POPULATION) * 1000
+    metrics['usa_bench'] = metrics.index.map(AAMC_USA_BENCHMARKS.get).astype(float)
+    gap = metrics['density'] - metrics['usa_bench']
+    metrics['usa_gap_docs'] = np.trunc(gap * (ISRAEL_POPULATION / 1000))
+    has_bench = metrics['usa_bench'].notna() & (metrics['usa_bench'] != 0)
+    gap_docs = metrics['usa_gap_docs'].fillna(0).astype(int).astype(str)
+    metrics['usa_text'] = np.where(~has_bench, "No Benchmark",
+                                   np.where(gap < 0, "Deficit: " + gap_docs, "Surplus: +" + gap_docs))
+    metrics['usa_color'] = np.where(~has_bench, "#95a5a6", np.where(gap < 0, "#e74c3c", "#27ae60"))
+    return metrics
 
-        global_velocity_data.append({'x': total_active, 'y': velocity, 'name': spec, 'color': usa_color})
+def year_count_matrix(codes, years, n_specs, lo, hi):
+    # (specialty x year) histogram in one bincount; rows are specialty codes, columns lo..hi-1
+    ok = (codes >= 0) & ~np.isnan(years)
+    flat = codes[ok] * (hi - lo) + (years[ok].astype(int) - lo)
+    return np.bincount(flat, minlength=n_specs * (hi - lo)).reshape(n_specs, hi - lo)
 
-        spec_start_years = spec_df_all_unique['spec_year'].dropna().astype(int)
-        joins_per_year = spec_start_years.value_counts().sort_index()
-        years_idx = list(range(1980, CURRENT_YEAR + 1))
-        joins_counts = [int(joins_per_year.get(y, 0)) for y in years_idx]
+def specialty_codes(df, specialties):
+    # Map category codes onto positions in `specialties`; specialties left out (and NaN, code -1) become -1
+    names = df['specialty_name'].astype('category')
+    to_spec = np.append(pd.Index(specialties).get_indexer(names.cat.categories), -1)
+    return to_spec[names.cat.codes.to_numpy()].astype(np.int64)
+
+def compute_trend_series(df, first, specialties):
+    # Joins per year, net pipeline history and forecast for every specialty at once.
+    # Counts in a year window (a, b] are O(1) differences of a cumulative count C(b) - C(a).
+    n_specs = len(specialties)
+    window = TREND_WINDOW_YEARS
+    lo = min(1900, HISTORY_START_YEAR - window - 1)
+    hi = CURRENT_YEAR + RETIREMENT_AGE_EXPERIENCE + FORECAST_YEARS + 2
+    codes = specialty_codes(df, specialties)[first]
+    spec_years = df['spec_year'].to_numpy(dtype=float, na_value=np.nan)[first]
+    retire_years = df['retirement_year_spec'].to_numpy(dtype=float, na_value=np.nan)[first]
+
+    starts = year_count_matrix(codes, spec_years, n_specs, lo, hi)
+    retires = year_count_matrix(codes, retire_years, n_specs, lo, hi)
+    c_start, c_retire = starts.cumsum(axis=1), retires.cumsum(axis=1)
+    col = lambda y: np.asarray(y) - lo
+
+    history = np.arange(HISTORY_START_YEAR, CURRENT_YEAR + 1)
+    joins = starts[:, col(history)]
+    # Inflow: specialty registrations in the trailing window (y - 8, y].
+    # Outflow: retirements (specialty year + RETIREMENT_AGE_EXPERIENCE) in the same window.
+    inflow = c_start[:, col(history)] - c_start[:, col(history - window)]
+    outflow = c_retire[:, col(history)] - c_retire[:, col(history - window)]
+    hist = inflow - outflow
+
+    # Forecast: registrations already on record from y - 8 up to this year, plus the
+    # recent 5-year average for each projected year, minus scheduled retirements.
+    recent = starts[:, col(np.arange(CURRENT_YEAR - 5, CURRENT_YEAR))].sum(axis=1)
+    avg_inflow = np.maximum(1, (recent / 5).astype(int))
+    future = np.arange(CURRENT_YEAR + 1, CURRENT_YEAR + 1 + FORECAST_YEARS)
+    count_real = c_start[:, [col(CURRENT_YEAR)]] - c_start[:, col(future - window - 1)]
+    proj_years = future - np.maximum(future - window, CURRENT_YEAR + 1) + 1
+    count_proj = proj_years[None, :] * avg_inflow[:, None]
+    outflow_fut = c_retire[:, col(future)] - c_retire[:, col(future - window)]
+    fut = count_real + count_proj - outflow_fut
+
+    return {'joins': joins, 'hist': hist, 'fut': fut, 'avg_inflow': avg_inflow}
+
+def build_dashboard_data(df):
+    print("⏳ Generating Dashboard...")
+    first, first_active = dedup_masks(df)
+    metrics = compute_specialty_metrics(df, first, first_active)
+    trends = compute_trend_series(df, first, metrics.index)
+    history_years = list(range(HISTORY_START_YEAR, CURRENT_YEAR + 1))
+    future_years = list(range(CURRENT_YEAR + 1, CURRENT_YEAR + 1 + FORECAST_YEARS))
+
+    dashboard_data = {}
+    global_velocity_data = []
+
+    for i, m in enumerate(metrics.itertuples()):
+        spec = m.Index
+        total_active = m.total_active
+        usa_bench = None if pd.isna(m.usa_bench) else m.usa_bench
+        density = m.density
+
+        global_velocity_data.append({'x': total_active, 'y': m.velocity, 'name': spec, 'color': m.usa_color})
+
+        years_idx = history_years
+        joins_counts = trends['joins'][i].tolist()
 
         us_x = []
         us_y = []
@@ -326,35 +773,12 @@ def generate_static_site():
             us_x = sorted(list(us_dict.keys()))
             us_y = [us_dict[y] for y in us_x]
 
-        recent_years = range(CURRENT_YEAR - 5, CURRENT_YEAR)
-        recent_inflow_sum = sum([joins_per_year.get(y, 0) for y in recent_years])
-        avg_inflow = max(1, int(recent_inflow_sum / 5))
-
-        history_years = list(range(1980, CURRENT_YEAR + 1))
-        future_years = list(range(CURRENT_YEAR + 1, CURRENT_YEAR + 5))
-        net_trend_history, net_trend_forecast = [], []
-        spec_retire_years = spec_df_all_unique['retirement_year_spec'].dropna().astype(int)
-
-        for y in history_years:
-            inflow = len(spec_start_years[(spec_start_years > (y - 8)) & (spec_start_years <= y)])
-            outflow = len(spec_retire_years[(spec_retire_years >= y) & (spec_retire_years < (y - 8))])
-            net_trend_history.append(inflow - outflow)
-
-        for y in future_years:
-            real_part = range(y - 8, CURRENT_YEAR + 1)
-            proj_part = range(max(y - 8, CURRENT_YEAR + 1), y + 1)
-            count_real = len(spec_start_years[spec_start_years.isin(real_part)])
-            count_proj = len(proj_part) * avg_inflow
-            outflow = len(spec_retire_years[(spec_retire_years >= y) & (spec_retire_years < (y - 8))])
-            net_trend_forecast.append((count_real + count_proj) - outflow)
-
-        bins = [0, 10, 25, 120]
-        labels = ['Juniors (0-10y)', 'Mid (10-25y)', 'Seniors (25-45y)']
-        exp_groups = pd.cut(unique_active_docs['spec_experience'], bins=bins, labels=labels, right=False)
-        exp_counts = exp_groups.value_counts().sort_index()
-        pie_labels = exp_counts.index.tolist()
-        pie_values = exp_counts.values.tolist()
-        
+        net_trend_history = trends['hist'][i].tolist()
+        net_trend_forecast = trends['fut'][i].tolist()
+
+        pie_labels = list(EXPERIENCE_LABELS)
+        pie_values = [int(getattr(m, col)) for col in PIE_COLUMNS]
+
         density_x = [density]
         density_y = ['Israel']
         density_colors = ['#3498db']
@@ -371,12 +795,12 @@ def generate_static_site():
 
         dashboard_data[spec] = {
             "total": int(total_active),
-            "net_now": int(net_now),
-            "usa_text": usa_text,
-            "usa_color": usa_color,
-            "ratio_val": replacement_ratio,
-            "ratio_color": ratio_color,
-            "count_over_45": int(count_over_45),
+            "net_now": int(m.net_now),
+            "usa_text": m.usa_text,
+            "usa_color": m.usa_color,
+            "ratio_val": m.replacement_ratio,
+            "ratio_color": m.ratio_color,
+            "count_over_45": int(m.count_over_45),
             "charts": {
                 "years_x": years_idx, 
                 "years_y": joins_counts,
@@ -397,8 +821,384 @@ def generate_static_site():
             }
         }
 
-    json_dashboard = json.dumps(dashboard_data, default=lambda x: int(x) if isinstance(x, (np.int64, np.int32)) else x)
-    json_global = json.dumps(global_velocity_data, default=lambda x: int(x) if isinstance(x, (np.int64, np.int32)) else x)
+    return dashboard_data, global_velocity_data
+
+def scenario_kpi(axes, values, digits=None):
+    # values are specialty-major: values[spec][axis0 index][axis1 index]...
+    values = np.asarray(values)
+    if digits is not None: values = np.round(values, digits)
+    return {"axes": list(axes), "values": values.tolist()}
+
+def compute_scenario_grid(df, specialties):
+    """Every per-specialty KPI and trend series over SCENARIO_GRID in one broadcasted pass.
+
+    The cleaned rows are histogrammed once per retirement age by (specialty, experience
+    year); each KPI threshold is then a lookup into the cumulative histogram, and each
+    trend window a difference of cumulative year counts, so the whole grid costs about
+    as much as the single-scenario metrics. KPIs are kept only on the parameters they
+    depend on (e.g. total on retirement age, density on retirement age x population).
+
+    `specialties` is the fixed list build_dashboard_data() kept, i.e. those with at
+    least MIN_ACTIVE_DOCTORS active doctors at the default retirement age. It is not
+    refiltered per scenario: a lower retirement age can take a listed specialty below
+    the threshold, and no scenario adds one.
+    """
+    grid = {k: np.asarray(v) for k, v in SCENARIO_GRID.items()}
+    if np.any(np.diff(grid['retire']) <= 0): raise ValueError("SCENARIO_GRID['retire'] must be strictly increasing")
+    R, J, V, W, P = (grid[k] for k in ('retire', 'junior', 'veteran', 'window', 'population'))
+    n_specs, n_r = len(specialties), len(R)
+    codes = specialty_codes(df, specialties)
+    key_codes = dedup_keys(df)
+    exp = df['gen_experience'].to_numpy(dtype=float, na_value=np.nan)
+    spec_exp = df['spec_experience'].to_numpy(dtype=float, na_value=np.nan)
+    has_license = df['license_num'].notna().to_numpy()
+    first = first_occurrence(key_codes)
+
+    # A row is the first *active* row of its key at retirement age r when its own
+    # experience is <= r and every earlier row of the key is above r. Over the sorted
+    # retirement grid that is a contiguous index range [r_from, r_to), so each row is
+    # added at r_from and removed at r_to, and a cumsum over r rebuilds every scenario.
+    earlier_min = (pd.Series(exp).groupby(key_codes).cummin().groupby(key_codes).shift(1)
+                   .fillna(np.inf).to_numpy())
+    r_from = np.searchsorted(R, exp, side='left')
+    r_to = np.searchsorted(R, earlier_min, side='left')
+    rows = np.flatnonzero((r_from < r_to) & (codes >= 0))
+    def per_retire(bucket, n_buckets, weights=None):
+        # (retire, specialty, bucket) counts of first-active rows via one +/- bincount
+        size = (n_r + 1) * n_specs * n_buckets
+        w = np.ones(len(rows)) if weights is None else weights
+        at = lambda r: (r[rows] * n_specs + codes[rows]) * n_buckets + bucket
+        edges = np.bincount(at(r_from), weights=w, minlength=size) - np.bincount(at(r_to), weights=w, minlength=size)
+        return edges.reshape(n_r + 1, n_specs, n_buckets).cumsum(axis=0)[:n_r].round().astype(np.int64)
+
+    # (retire, specialty, experience year) histogram and its running total over experience
+    n_exp = CURRENT_YEAR - 1900 + 2
+    cum = per_retire(np.clip(exp[rows], 0, n_exp - 1).astype(np.int64), n_exp).cumsum(axis=2)
+    counted = cum[:, :, -1]
+    total = per_retire(0, 1, has_license[rows].astype(float))[:, :, 0]
+    juniors = cum[:, :, J]                                   # experience <= j
+    veterans = counted[:, :, None] - cum[:, :, V - 1]        # experience >= v
+    outflow_now = counted - cum[np.arange(n_r), :, R - 11]   # experience >= r - 10
+
+    kept_first = first & (codes >= 0)
+    first_hist = np.bincount(codes[kept_first] * n_exp + np.clip(exp[kept_first], 0, n_exp - 1).astype(np.int64),
+                             minlength=n_specs * n_exp).reshape(n_specs, n_exp).cumsum(axis=1)
+    # Fixed at 45 years, like the single-scenario metric, whatever the retirement slider says
+    count_over_45 = first_hist[:, -1] - first_hist[:, 45]
+
+    # Pie bins on specialty experience, same as pd.cut(..., right=False); out-of-range rows go to a spare bin
+    n_bins = len(PIE_COLUMNS)
+    b = np.digitize(spec_exp[rows], EXPERIENCE_BINS) - 1
+    pie = per_retire(np.where((b >= 0) & (b < n_bins), b, n_bins), n_bins + 1)[:, :, :n_bins]
+
+    ratio = replacement_ratio(juniors[:, :, :, None], veterans[:, :, None, :])
+    ratio_color = ratio_color_index(ratio)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        velocity = np.nan_to_num(juniors / total[:, :, None] * 100)
+    net_now = juniors - outflow_now[:, :, None]
+
+    bench = np.array([AAMC_USA_BENCHMARKS.get(s) or np.nan for s in specialties], dtype=float)
+    density = total[:, :, None] / P[None, None, :] * 1000
+    gap = density - bench[None, :, None]
+    gap_docs = np.nan_to_num(np.trunc(gap * (P / 1000)[None, None, :])).astype(np.int64)
+    gap_color = (gap >= 0).astype(int)
+
+    # Trend series: registrations are fixed, retirements shift with r, windows with w.
+    # With cumulative year counts C, a count in (a, b] is C(b) - C(a) for every (r, w) at once.
+    lo = min(1900, HISTORY_START_YEAR - int(W.max()) - 1)
+    hi = CURRENT_YEAR + FORECAST_YEARS + 2
+    spec_years = df['spec_year'].to_numpy(dtype=float, na_value=np.nan)[kept_first]
+    base_years = df['spec_year'].fillna(df['gen_year']).to_numpy(dtype=float, na_value=np.nan)[kept_first]
+    starts = year_count_matrix(codes[kept_first], spec_years, n_specs, lo, hi)
+    c_start = starts.cumsum(axis=1)
+    c_base = year_count_matrix(codes[kept_first], base_years, n_specs, lo, hi).cumsum(axis=1)
+    history = np.arange(HISTORY_START_YEAR, CURRENT_YEAR + 1)
+    future = np.arange(CURRENT_YEAR + 1, CURRENT_YEAR + 1 + FORECAST_YEARS)
+    rw = lambda years: (years[None, None, :] - R[:, None, None], W[None, :, None])
+
+    shifted, window = rw(history)
+    inflow = c_start[:, history - lo][:, None, None, :] - c_start[:, history[None, :] - W[:, None] - lo][:, None]
+    hist = inflow - (c_base[:, shifted - lo] - c_base[:, shifted - window - lo])
+
+    recent = starts[:, np.arange(CURRENT_YEAR - 5, CURRENT_YEAR) - lo].sum(axis=1)
+    avg_inflow = np.maximum(1, (recent / 5).astype(int))
+    count_real = c_start[:, [CURRENT_YEAR - lo]][:, None, :] - c_start[:, future[None, :] - W[:, None] - 1 - lo]
+    proj_years = future[None, :] - np.maximum(future[None, :] - W[:, None], CURRENT_YEAR + 1) + 1
+    count_proj = proj_years[None, :, :] * avg_inflow[:, None, None]
+    shifted, window = rw(future)
+    fut = (count_real + count_proj)[:, None] - (c_base[:, shifted - lo] - c_base[:, shifted - window - lo])
+
+    # Chart ranges follow the Israeli total, which scales the normalized US series
+    joins_max = starts[:, history - lo].max(axis=1)
+    us_max = np.zeros(n_specs)
+    us_total = np.full(n_specs, np.nan)
+    for i, spec in enumerate(specialties):
+        us_name = US_MAPPING.get(spec)
+        if us_name and us_name in US_NEW_LICENSES and us_name in US_TOTAL_ACTIVE:
+            us_max[i] = max(US_NEW_LICENSES[us_name].values())
+            if US_TOTAL_ACTIVE[us_name] > 0: us_total[i] = US_TOTAL_ACTIVE[us_name]
+    norm = np.where(np.isnan(us_total), 1.0, total / np.where(np.isnan(us_total), 1.0, us_total))
+    y1_max = np.maximum(joins_max[None, :], us_max[None, :] * norm) * 1.1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y2_max = np.where(norm > 0, y1_max / norm, 100)
+
+    spec_major = lambda a: np.moveaxis(a, 1, 0)
+    return {
+        "params": {k: v.tolist() for k, v in grid.items()},
+        "defaults": {k: SCENARIO_GRID[k].index(v) for k, v in SCENARIO_DEFAULTS.items()},
+        "kpis": {
+            "total": scenario_kpi(['retire'], spec_major(total)),
+            "count_over_45": scenario_kpi([], count_over_45),
+            "pie": scenario_kpi(['retire'], spec_major(pie)),
+            "net_now": scenario_kpi(['retire', 'junior'], spec_major(net_now)),
+            "velocity": scenario_kpi(['retire', 'junior'], spec_major(velocity), 2),
+            "ratio": scenario_kpi(['retire', 'junior', 'veteran'], spec_major(ratio)),
+            "ratio_color": scenario_kpi(['retire', 'junior', 'veteran'], spec_major(ratio_color)),
+            "density": scenario_kpi(['retire', 'population'], spec_major(density), 5),
+            "gap": scenario_kpi(['retire', 'population'], spec_major(gap_docs)),
+            "gap_color": scenario_kpi(['retire', 'population'], spec_major(gap_color)),
+            "y1_max": scenario_kpi(['retire'], spec_major(y1_max), 2),
+            "y2_max": scenario_kpi(['retire'], spec_major(y2_max), 2),
+        },
+        # (specialty, retire, window, year) — charted per specialty, so kept out of the KPI table
+        "series": {"hist": hist.tolist(), "fut": fut.tolist()},
+    }
+
+def json_default(x):
+    return int(x) if isinstance(x, (np.int64, np.int32)) else x
+
+def payload_hash(payload):
+    # Stable key order, so equal metrics always hash (and serialize) identically
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=json_default)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def format_as_of(last_modified):
+    try:
+        return datetime.datetime.fromisoformat(last_modified).strftime("%d/%m/%Y %H:%M")
+    except (TypeError, ValueError):
+        return last_modified
+
+# --- PAGE PAYLOAD ---
+# Compact schema for the data embedded in (or sharded next to) the page: axes that
+# every specialty shares are stored once, per-specialty values are columnar and the
+# long yearly series are delta-encoded integers. expandRecord() in the page rebuilds
+# the dashboard_data shape on demand.
+
+def to_native(obj):
+    # NumPy-aware conversion so the encoder never needs a default= callback; plain JSON
+    # values return before the NumPy checks, so rendering saved metrics never imports it
+    if isinstance(obj, dict): return {k: to_native(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)): return [to_native(v) for v in obj]
+    if obj is None or isinstance(obj, (str, int, float)): return obj
+    if isinstance(obj, np.ndarray): return obj.tolist()
+    if isinstance(obj, np.integer): return int(obj)
+    if isinstance(obj, np.floating): return float(obj)
+    return obj
+
+def dump_compact(obj):
+    return json.dumps(to_native(obj), separators=(',', ':'), sort_keys=True, ensure_ascii=False)
+
+def delta_encode(values):
+    values = [int(v) for v in values]
+    return [b - a for a, b in zip([0] + values, values)]
+
+def shared_axes(dashboard_data):
+    first = next(iter(dashboard_data.values()))['charts'] if dashboard_data else None
+    axes = {
+        "year0": HISTORY_START_YEAR, "year1": CURRENT_YEAR,
+        "fut_x": list(range(CURRENT_YEAR + 1, CURRENT_YEAR + 1 + FORECAST_YEARS)),
+        "us_x": sorted(next(iter(US_NEW_LICENSES.values())).keys()),
+        "pie_labels": list(EXPERIENCE_LABELS),
+    }
+    if first is not None and (first['years_x'] != list(range(axes['year0'], axes['year1'] + 1))
+                              or first['fut_x'] != axes['fut_x'] or first['pie_labels'] != axes['pie_labels']):
+        raise ValueError("dashboard series do not match the shared page axes")
+    return axes
+
+def compact_record(entry, axes, hist, fut, past=None):
+    # Only what no scenario changes, plus this specialty's (retire x window) trend grids
+    # and its recorded KPI history (aligned to axes.history_dates); every
+    # scenario-dependent KPI is looked up in the shared scenario table instead
+    c = entry['charts']
+    if c['us_x'] and list(c['us_x']) != axes['us_x']:
+        raise ValueError("US series does not match the shared us_x axis")
+    return {
+        "usa_bench": c['usa_bench'],
+        "joins": delta_encode(c['years_y']),
+        "us_y": c['us_y'] or None,
+        "hist": [[delta_encode(series) for series in by_window] for by_window in hist],
+        "fut": fut,
+        "past": past,
+    }
+
+def encode_payload(dashboard_data, scenarios, history=None):
+    axes = dict(shared_axes(dashboard_data), history_dates=history["dates"] if history else [])
+    names = list(dashboard_data)
+    past = [{k: history[k][i] for k in HISTORY_CHART_KPIS} if history else None for i in range(len(names))]
+    records = [compact_record(dashboard_data[n], axes, scenarios["series"]["hist"][i], scenarios["series"]["fut"][i],
+                              past[i])
+               for i, n in enumerate(names)]
+    cols = {k: [r[k] for r in records] for k in (records[0] if records else {})}
+    table = {k: scenarios[k] for k in ("params", "defaults", "kpis")}
+    return {"v": 2, "axes": axes, "names": names, "scenarios": table, "cols": cols}
+
+def encode_shards(dashboard_data, scenarios, history=None):
+    # One JSON blob per specialty, named by its content hash so hosts can cache it
+    # forever, plus a small index with the shared axes, the scenario KPI table and the shard names
+    index = encode_payload(dashboard_data, scenarios, history)
+    cols = index.pop("cols")
+    blobs, shards = {}, {}
+    for i, spec in enumerate(index["names"]):
+        blob = dump_compact({k: v[i] for k, v in cols.items()}).encode("utf-8")
+        name = hashlib.sha256(blob).hexdigest()[:16] + ".json"
+        blobs[name] = blob
+        shards[spec] = name
+    index["shards"] = shards
+    blobs["index.json"] = dump_compact(index).encode("utf-8")
+    return blobs
+
+def write_shards(blobs, out_dir, compress=False):
+    shard_dir = os.path.join(out_dir, SHARD_DIR)
+    os.makedirs(shard_dir, exist_ok=True)
+    for name, blob in blobs.items():
+        path = os.path.join(shard_dir, name)
+        # Content-addressed shards are already up to date; the index name is fixed
+        if name == "index.json" or not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(blob)
+        if compress: precompress(path)
+    for path in glob.glob(os.path.join(shard_dir, "*.json*")):
+        if os.path.basename(path).split(".json")[0] + ".json" not in blobs: os.remove(path)
+    print(f"🧩 Wrote {len(blobs) - 1} specialty shards to {shard_dir}/")
+
+# --- PRODUCTION BUILD ---
+# Conservative, dependency-free minification: CSS whitespace/comments are collapsed,
+# JS keeps one statement per line (so automatic semicolon insertion still holds)
+# and only loses indentation, blank lines and whole-line comments.
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+def minify_js(js):
+    lines = (line.strip() for line in js.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+def minify_markup(markup):
+    lines = (line.strip() for line in markup.splitlines())
+    return re.sub(r'>\s+<', '><', "\n".join(line for line in lines if line))
+
+def minify_html(html):
+    out, pos = [], 0
+    for m in re.finditer(r'(<style[^>]*>)(.*?)(</style>)|(<script[^>]*>)(.*?)(</script>)', html, flags=re.S):
+        out.append(minify_markup(html[pos:m.start()]))
+        if m.group(1):
+            out.append(m.group(1) + minify_css(m.group(2)) + m.group(3))
+        else:
+            out.append(m.group(4) + minify_js(m.group(5)) + m.group(6))
+        pos = m.end()
+    out.append(minify_markup(html[pos:]))
+    return "".join(out)
+
+def precompress(path):
+    # .gz/.br siblings at maximum compression so static hosts can serve them as-is
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path + ".gz", "wb") as f:
+        # mtime=0 keeps the .gz byte-identical for identical input
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+    return len(data)
+
+# --- PLOTLY BUNDLE ---
+
+def fetch_plotly_bundle(cache_dir=CACHE_DIR, offline=False):
+    # The pinned bundle never changes: a committed copy wins, then one downloaded earlier
+    # (urllib rather than requests keeps --render-from on the standard library)
+    name = os.path.basename(PLOTLY_BUNDLE_URL)
+    path = os.path.join(cache_dir, "vendor", name)
+    for local in (os.path.join(VENDOR_DIR, name), path):
+        if os.path.exists(local): return local
+    if offline:
+        print(f"❌ Offline and no {name} in {VENDOR_DIR}/ or {os.path.dirname(path)}/; "
+              "pass --plotly-bundle with a local copy")
+        return None
+    import urllib.request
+    print(f"🌐 Downloading {PLOTLY_BUNDLE_URL}")
+    try:
+        with urllib.request.urlopen(PLOTLY_BUNDLE_URL, timeout=REQUEST_TIMEOUT) as response:
+            bundle = response.read()
+    except OSError as e:
+        print(f"❌ Could not download the plotly.js bundle ({e}); pass --plotly-bundle with a local copy")
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(bundle)
+    os.replace(path + ".tmp", path)
+    return path
+
+def bundle_trace_types(bundle):
+    # Every trace module registers itself as {moduleType:"trace",name:"<type>",...}
+    return {m.decode() for m in re.findall(rb'moduleType:\s*"trace",\s*name:\s*"(\w+)"', bundle)}
+
+def load_plotly_bundle(path=None, cache_dir=CACHE_DIR, offline=False):
+    """Read the plotly.js bundle to vendor and check it registers exactly the trace types the page uses.
+
+    Defaults to the pinned partial build at PLOTLY_BUNDLE_URL (scatter, bar and pie only):
+    the copy committed under VENDOR_DIR, else a cached download; --offline never downloads.
+    A full bundle is refused: vendoring it would commit megabytes the page never runs.
+    Returns (file name, bytes), the name carrying a content hash so it can be cached forever.
+    """
+    path = path or fetch_plotly_bundle(cache_dir, offline)
+    if path is None: return None
+    if not os.path.exists(path):
+        print(f"❌ No plotly.js bundle found at {path}; pass --plotly-bundle")
+        return None
+    with open(path, "rb") as f:
+        bundle = f.read()
+    traces = bundle_trace_types(bundle)
+    missing = sorted(set(PLOTLY_TRACE_TYPES) - traces)
+    if missing:
+        print(f"❌ {path} does not include the trace types {', '.join(missing)}")
+        return None
+    extra = sorted(traces - set(PLOTLY_TRACE_TYPES))
+    if extra:
+        print(f"❌ {path} also bundles {len(extra)} unused trace types ({', '.join(extra[:5])}, ...); "
+              f"use a partial build such as {PLOTLY_BUNDLE_URL}")
+        return None
+    # The banner reads "plotly.js v4.1.1" for full builds, "plotly.js (basic - minified) v2.35.2" for partial ones
+    version = re.search(rb'plotly\.js[^\n]*? v([\d.]+)', bundle[:512])
+    print(f"📊 Plotly bundle: v{version.group(1).decode() if version else '?'}, {len(bundle) / 1024:.0f} KB from {path}")
+    return f"plotly-{hashlib.sha256(bundle).hexdigest()[:16]}.min.js", bundle
+
+def write_plotly_bundle(name, bundle, out_dir, compress=False):
+    asset_dir = os.path.join(out_dir, ASSETS_DIR)
+    os.makedirs(asset_dir, exist_ok=True)
+    path = os.path.join(asset_dir, name)
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(bundle)
+    # The name is content-addressed, so existing siblings are already up to date (brotli -11 takes seconds here)
+    if compress and not os.path.exists(path + ".br"):
+        precompress(path)
+    for old in glob.glob(os.path.join(asset_dir, "plotly-*.min.js*")):
+        if not os.path.basename(old).startswith(name): os.remove(old)
+
+def payload_size_report(dashboard_data, global_velocity_data, scenarios):
+    verbose = sum(len(json.dumps(part, default=json_default)) for part in (dashboard_data, global_velocity_data, scenarios))
+    compact = len(dump_compact(encode_payload(dashboard_data, scenarios)).encode("utf-8"))
+    print(f"📦 Page payload: {verbose / 1024:.1f} KB verbose -> {compact / 1024:.1f} KB compact "
+          f"({100 * (1 - compact / verbose):.0f}% smaller)")
+
+def render_site(dashboard_data, scenarios, updated_label=TIMESTAMP, content_hash="", shards=False,
+                plotly_src=PLOTLY_BUNDLE_URL, history=None):
+    # Sharded pages carry no inline data; the client fetches SHARD_DIR/index.json instead
+    json_payload = "null" if shards else dump_compact(encode_payload(dashboard_data, scenarios, history))
+    json_payload = json_payload.replace("</", "<\\/")
 
     html_content = f"""
 <!DOCTYPE html>
@@ -406,8 +1206,9 @@ def generate_static_site():
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <meta name="dashboard-content-hash" content="{content_hash}">
     <title>Israel Medical Workforce Dashboard</title>
-    <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
+    <script src="{plotly_src}"></script>
     <style>
         @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600;700&display=swap');
         
@@ -538,6 +1339,27 @@ def generate_static_site():
             box-shadow: 0 0 0 4px rgba(118, 75, 162, 0.1);
         }}
         
+        .scenario-grid {{
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(180px, 1fr));
+            gap: 20px;
+            margin-top: 25px;
+        }}
+        
+        .scenario-grid label {{
+            display: block;
+            margin: 0;
+            font-size: 0.95em;
+            text-align: left;
+        }}
+        
+        .scenario-grid input {{
+            display: block;
+            width: 100%;
+            margin-top: 8px;
+            accent-color: #667eea;
+        }}
+        
         .kpi-row {{
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
@@ -616,6 +1438,16 @@ def generate_static_site():
             grid-column: 1 / -1;
         }}
         
+        .notice {{
+            background: #fdecea;
+            color: #c0392b;
+            border: 1px solid #f5c6cb;
+            border-radius: 12px;
+            padding: 15px 20px;
+            margin-bottom: 30px;
+            font-weight: 500;
+        }}
+        
         .footer {{
             text-align: center;
             margin-top: 60px;
@@ -643,6 +1475,8 @@ def generate_static_site():
         <div class="badge">Live Data from Ministry of Health</div>
     </div>
 
+    <div id="loadNotice" class="notice" hidden></div>
+
     <div class="section-title">🗺️ Global Market Velocity Map</div>
     <div id="chart-velocity" class="chart-box" style="height: 550px;"></div>
 
@@ -650,6 +1484,7 @@ def generate_static_site():
     <div class="controls">
         <label for="specSelect">Select Specialty:</label>
         <select id="specSelect" onchange="updateDashboard()"></select>
+        <div class="scenario-grid" id="scenarioControls"></div>
     </div>
 
     <div class="kpi-row">
@@ -672,88 +1507,306 @@ def generate_static_site():
         <div id="chart-trend" class="chart-box chart-full"></div>
         <div id="chart-exp" class="chart-box"></div>
         <div id="chart-dens" class="chart-box"></div>
+        <div id="chart-history" class="chart-box chart-full"></div>
     </div>
     
     <div class="footer">
-        <strong>Last Updated:</strong> {TIMESTAMP} • <strong>Data Source:</strong> Israel Ministry of Health API
+        <strong>Last Updated:</strong> {updated_label} • <strong>Data Source:</strong> Israel Ministry of Health API
     </div>
 </div>
 
 <script>
-    const data = {json_dashboard};
-    const globalData = {json_global};
-    const specialties = Object.keys(data).sort();
+    const SHARDED = {'true' if shards else 'false'};
+    const payload = {json_payload};
+    const RATIO_COLORS = {dump_compact(RATIO_COLORS)};
+    const GAP_COLORS = {dump_compact(GAP_COLORS)};
+    let axes = null;
+    let scenarios = null;
+    let scenario = {{}};
+    let specialties = [];
+    let shardFiles = {{}};
+    const shardCache = new Map();
+
+    function undelta(values) {{
+        const out = new Array(values.length);
+        let acc = 0;
+        for (let i = 0; i < values.length; i++) {{
+            acc += values[i];
+            out[i] = acc;
+        }}
+        return out;
+    }}
+
+    // Scenario KPIs are precomputed per slider position: values[spec][index on each of its axes]
+    function kpi(name, i) {{
+        const k = scenarios.kpis[name];
+        let v = k.values[i];
+        k.axes.forEach(a => v = v[scenario[a]]);
+        return v;
+    }}
+
+    // Rebuild the full per-specialty object from a compact record, the shared axes
+    // and the KPI table at the current scenario
+    function expandRecord(r, i) {{
+        const years = [];
+        for (let y = axes.year0; y <= axes.year1; y++) years.push(y);
+        const hasUs = r.us_y !== null;
+        const hasBench = !!r.usa_bench;
+        const density = kpi('density', i);
+        const deficit = kpi('gap_color', i) === 0;
+        return {{
+            total: kpi('total', i),
+            net_now: kpi('net_now', i),
+            usa_text: hasBench ? (deficit ? 'Deficit: ' : 'Surplus: +') + kpi('gap', i) : 'No Benchmark',
+            usa_color: hasBench ? GAP_COLORS[kpi('gap_color', i)] : '#95a5a6',
+            ratio_val: kpi('ratio', i),
+            ratio_color: RATIO_COLORS[kpi('ratio_color', i)],
+            count_over_45: kpi('count_over_45', i),
+            charts: {{
+                years_x: years,
+                years_y: undelta(r.joins),
+                us_x: hasUs ? axes.us_x : [],
+                us_y: hasUs ? r.us_y : [],
+                y1_range: [0, kpi('y1_max', i)],
+                y2_range: [0, kpi('y2_max', i)],
+                pie_labels: axes.pie_labels,
+                pie_values: kpi('pie', i),
+                hist_x: years,
+                hist_y: undelta(r.hist[scenario.retire][scenario.window]),
+                fut_x: axes.fut_x,
+                fut_y: r.fut[scenario.retire][scenario.window],
+                dens_x: hasBench ? [density, r.usa_bench] : [density],
+                dens_y: hasBench ? ['Israel', 'USA'] : ['Israel'],
+                dens_c: hasBench ? ['#3498db', '#34495e'] : ['#3498db'],
+                usa_bench: r.usa_bench,
+                past_x: axes.history_dates,
+                past_total: r.past ? r.past.total_active : [],
+                past_ratio: r.past ? r.past.replacement_ratio : []
+            }}
+        }};
+    }}
+
+    function setup(p) {{
+        axes = p.axes;
+        specialties = p.names;
+        scenarios = p.scenarios;
+        scenario = Object.assign({{}}, p.scenarios.defaults);
+        // Built with --no-history (or before the first recorded build): no history chart
+        document.getElementById('chart-history').style.display = axes.history_dates.length ? '' : 'none';
+    }}
+
+    const SCENARIO_LABELS = {{
+        retire: ['Retirement after', v => v + 'y experience'],
+        junior: ['Junior up to', v => v + 'y'],
+        veteran: ['Veteran from', v => v + 'y'],
+        window: ['Trend window', v => v + ' years'],
+        population: ['Israel population', v => (v / 1e6).toFixed(2) + 'M']
+    }};
+
+    // One slider per scenario parameter; moving one only re-indexes the precomputed table
+    function buildScenarioControls() {{
+        const box = document.getElementById('scenarioControls');
+        Object.keys(SCENARIO_LABELS).filter(name => name in scenarios.params).forEach(name => {{
+            const values = scenarios.params[name];
+            const [title, format] = SCENARIO_LABELS[name];
+            const label = document.createElement('label');
+            const output = document.createElement('span');
+            const slider = document.createElement('input');
+            slider.type = 'range';
+            slider.min = 0;
+            slider.max = values.length - 1;
+            slider.step = 1;
+            slider.value = scenario[name];
+            output.innerText = format(values[scenario[name]]);
+            slider.addEventListener('input', () => {{
+                scenario[name] = +slider.value;
+                output.innerText = format(values[scenario[name]]);
+                drawVelocityMap();
+                updateDashboard();
+            }});
+            label.appendChild(document.createTextNode(title + ': '));
+            label.appendChild(output);
+            label.appendChild(slider);
+            box.appendChild(label);
+        }});
+    }}
 
     const chartConfig = {{
         responsive: true,
         displayModeBar: false
     }};
 
-    const mapTrace = {{
-        x: globalData.map(d => d.x),
-        y: globalData.map(d => d.y),
-        text: globalData.map(d => d.name),
-        mode: 'markers',
-        marker: {{
-            size: globalData.map(d => Math.sqrt(d.x) * 1.8),
-            color: globalData.map(d => d.y),
-            colorscale: [
-                [0, '#e74c3c'],
-                [0.5, '#f39c12'],
-                [1, '#27ae60']
-            ],
-            showscale: true,
-            colorbar: {{
-                title: 'Velocity %',
-                thickness: 15,
-                len: 0.7
+    function drawVelocityMap() {{
+        const globalData = specialties.map((name, i) => ({{
+            x: kpi('total', i),
+            y: kpi('velocity', i),
+            name: name
+        }}));
+        const mapTrace = {{
+            x: globalData.map(d => d.x),
+            y: globalData.map(d => d.y),
+            text: globalData.map(d => d.name),
+            mode: 'markers',
+            marker: {{
+                size: globalData.map(d => Math.sqrt(d.x) * 1.8),
+                color: globalData.map(d => d.y),
+                colorscale: [
+                    [0, '#e74c3c'],
+                    [0.5, '#f39c12'],
+                    [1, '#27ae60']
+                ],
+                showscale: true,
+                colorbar: {{
+                    title: {{ text: 'Velocity %' }},
+                    thickness: 15,
+                    len: 0.7
+                }},
+                opacity: 0.85,
+                line: {{
+                    width: 2,
+                    color: 'white'
+                }}
             }},
-            opacity: 0.85,
-            line: {{
-                width: 2,
-                color: 'white'
-            }}
-        }},
-        hovertemplate: '<b>%{{text}}</b><br>Total: %{{x}}<br>Velocity: %{{y:.1f}}%<extra></extra>'
-    }};
+            hovertemplate: '<b>%{{text}}</b><br>Total: %{{x}}<br>Velocity: %{{y:.1f}}%<extra></extra>'
+        }};
     
-    Plotly.newPlot('chart-velocity', [mapTrace], {{
-        title: {{
-            text: 'Workforce Size vs Growth Velocity',
-            font: {{ size: 20, family: 'Inter', weight: 600 }}
-        }},
-        xaxis: {{ 
-            title: 'Total Active Doctors',
-            gridcolor: '#f0f0f0',
-            showline: true,
-            linewidth: 2,
-            linecolor: '#e2e8f0'
-        }},
-        yaxis: {{ 
-            title: 'Growth Velocity (% Juniors)',
-            gridcolor: '#f0f0f0',
-            showline: true,
-            linewidth: 2,
-            linecolor: '#e2e8f0'
-        }},
-        hovermode: 'closest',
-        plot_bgcolor: '#fafafa',
-        paper_bgcolor: 'white',
-        margin: {{ t: 60, b: 60, l: 60, r: 60 }}
-    }}, chartConfig);
+        drawChart('chart-velocity', [mapTrace], {{
+            title: {{
+                text: 'Workforce Size vs Growth Velocity',
+                font: {{ size: 20, family: 'Inter', weight: 600 }}
+            }},
+            xaxis: {{ 
+                title: {{ text: 'Total Active Doctors' }},
+                gridcolor: '#f0f0f0',
+                showline: true,
+                linewidth: 2,
+                linecolor: '#e2e8f0'
+            }},
+            yaxis: {{ 
+                title: {{ text: 'Growth Velocity (% Juniors)' }},
+                gridcolor: '#f0f0f0',
+                showline: true,
+                linewidth: 2,
+                linecolor: '#e2e8f0'
+            }},
+            hovermode: 'closest',
+            plot_bgcolor: '#fafafa',
+            paper_bgcolor: 'white',
+            margin: {{ t: 60, b: 60, l: 60, r: 60 }}
+        }});
+    }}
 
     const select = document.getElementById('specSelect');
-    specialties.forEach(spec => {{
-        const opt = document.createElement('option');
-        opt.value = spec;
-        opt.innerHTML = spec;
-        select.appendChild(opt);
-    }});
+    function fillSelect() {{
+        specialties.forEach(spec => {{
+            const opt = document.createElement('option');
+            opt.value = spec;
+            opt.innerHTML = spec;
+            select.appendChild(opt);
+        }});
+    }}
+
+    // Sharded builds fetch one specialty at a time; each shard is fetched once and kept in memory
+    function loadSpecialty(spec) {{
+        if (!SHARDED) {{
+            const i = specialties.indexOf(spec);
+            const record = {{}};
+            Object.keys(payload.cols).forEach(k => record[k] = payload.cols[k][i]);
+            return Promise.resolve(record);
+        }}
+        if (!shardCache.has(spec)) {{
+            const request = fetch('{SHARD_DIR}/' + shardFiles[spec])
+                .then(r => {{
+                    if (!r.ok) throw new Error('Failed to load ' + spec);
+                    return r.json();
+                }})
+                .catch(err => {{
+                    shardCache.delete(spec);
+                    throw err;
+                }});
+            shardCache.set(spec, request);
+        }}
+        return shardCache.get(spec);
+    }}
+
+    function prefetchNeighbours(spec) {{
+        const i = specialties.indexOf(spec);
+        [i - 1, i + 1].forEach(j => {{
+            if (j >= 0 && j < specialties.length) loadSpecialty(specialties[j]).catch(() => {{}});
+        }});
+    }}
+
+    // Shown when a data file fails to load; cleared by the next successful switch
+    const notice = document.getElementById('loadNotice');
+    function showNotice(message) {{
+        notice.textContent = message;
+        notice.hidden = !message;
+    }}
+
+    // Per-switch render timings, readable from the console or by automated checks
+    window.dashboardTimings = [];
 
     function updateDashboard() {{
         const spec = select.value;
-        const d = data[spec];
-        
+        const t0 = performance.now();
+        loadSpecialty(spec).then(record => {{
+            if (select.value !== spec) return;
+            showNotice('');
+            const t1 = performance.now();
+            return renderSpecialty(expandRecord(record, specialties.indexOf(spec))).then(() => {{
+                const timing = {{
+                    spec: spec,
+                    load_ms: +(t1 - t0).toFixed(1),
+                    render_ms: +(performance.now() - t1).toFixed(1)
+                }};
+                window.dashboardTimings.push(timing);
+                console.log('[dashboard] ' + spec + ': load ' + timing.load_ms + ' ms, render ' + timing.render_ms + ' ms');
+                prefetchNeighbours(spec);
+            }});
+        }}).catch(err => {{
+            console.error(err);
+            showNotice('⚠️ Could not load the data for ' + spec + '. Pick it again to retry.');
+        }});
+    }}
+
+    // The specialty charts are created once; later switches go through Plotly.react,
+    // which diffs against the current figure and only redraws the traces and axes that changed
+    const drawnCharts = new Set();
+    function plotChart(id, data, layout) {{
+        if (drawnCharts.has(id)) return Plotly.react(id, data, layout, chartConfig);
+        drawnCharts.add(id);
+        return Plotly.newPlot(id, data, layout, chartConfig);
+    }}
+
+    // A chart is only drawn once its box scrolls near the viewport; until then the
+    // latest figure for it is parked in pendingCharts and replaced on every switch
+    const pendingCharts = new Map();
+    const visibleCharts = new Set();
+    const chartObserver = 'IntersectionObserver' in window ? new IntersectionObserver(entries => {{
+        entries.forEach(entry => {{
+            if (!entry.isIntersecting) return;
+            const id = entry.target.id;
+            chartObserver.unobserve(entry.target);
+            visibleCharts.add(id);
+            if (pendingCharts.has(id)) {{
+                const [data, layout] = pendingCharts.get(id);
+                pendingCharts.delete(id);
+                plotChart(id, data, layout);
+            }}
+        }});
+    }}, {{ rootMargin: '200px 0px' }}) : null;
+    document.querySelectorAll('.chart-box').forEach(el => {{
+        if (chartObserver) chartObserver.observe(el);
+        else visibleCharts.add(el.id);
+    }});
+
+    function drawChart(id, data, layout) {{
+        if (visibleCharts.has(id)) return plotChart(id, data, layout);
+        pendingCharts.set(id, [data, layout]);
+        return Promise.resolve();
+    }}
+
+    function renderSpecialty(d) {{
         document.getElementById('kpi-total').innerText = d.total.toLocaleString();
         
         const ratioElem = document.getElementById('kpi-ratio');
@@ -784,11 +1837,11 @@ def generate_static_site():
             }},
             margin: {{ t: 60, b: 60, l: 60, r: 80 }},
             xaxis: {{ 
-                title: 'Year',
+                title: {{ text: 'Year' }},
                 gridcolor: '#f0f0f0'
             }},
             yaxis: {{ 
-                title: 'Israel Count',
+                title: {{ text: 'Israel Count' }},
                 range: d.charts.y1_range,
                 gridcolor: '#f0f0f0'
             }},
@@ -829,7 +1882,7 @@ def generate_static_site():
             dataJoins.push(traceUS);
             
             layoutJoins.yaxis2 = {{
-                title: 'USA Count',
+                title: {{ text: 'USA Count' }},
                 overlaying: 'y',
                 side: 'right',
                 range: d.charts.y2_range,
@@ -837,7 +1890,7 @@ def generate_static_site():
             }};
         }}
 
-        Plotly.newPlot('chart-joins', dataJoins, layoutJoins, chartConfig);
+        const drawJoins = drawChart('chart-joins', dataJoins, layoutJoins);
 
         const traceHist = {{
             x: d.charts.hist_x,
@@ -870,7 +1923,7 @@ def generate_static_site():
             hovertemplate: '<b>Projected</b><br>Year: %{{x}}<br>Net: %{{y}}<extra></extra>'
         }};
 
-        Plotly.newPlot('chart-trend', [traceHist, traceFut], {{
+        const drawTrend = drawChart('chart-trend', [traceHist, traceFut], {{
             title: {{
                 text: 'Net Pipeline Trend (Inflow vs Retirement)',
                 font: {{ size: 18, family: 'Inter', weight: 600 }}
@@ -889,12 +1942,12 @@ def generate_static_site():
                 }}
             }}],
             xaxis: {{ 
-                title: 'Year',
+                title: {{ text: 'Year' }},
                 range: [1980, 2035],
                 gridcolor: '#f0f0f0'
             }},
             yaxis: {{ 
-                title: 'Net Balance',
+                title: {{ text: 'Net Balance' }},
                 gridcolor: '#f0f0f0',
                 zeroline: true,
                 zerolinecolor: '#95a5a6',
@@ -909,7 +1962,7 @@ def generate_static_site():
             }},
             plot_bgcolor: '#fafafa',
             paper_bgcolor: 'white'
-        }}, chartConfig);
+        }});
 
         var pieData = [{{
             values: d.charts.pie_values,
@@ -931,7 +1984,7 @@ def generate_static_site():
             hovertemplate: '<b>%{{label}}</b><br>Count: %{{value}}<br>Percentage: %{{percent}}<extra></extra>'
         }}];
         
-        Plotly.newPlot('chart-exp', pieData, {{
+        const drawExp = drawChart('chart-exp', pieData, {{
             title: {{
                 text: 'Experience Distribution',
                 font: {{ size: 18, family: 'Inter', weight: 600 }}
@@ -943,7 +1996,7 @@ def generate_static_site():
                 orientation: 'h',
                 y: -0.1
             }}
-        }}, chartConfig);
+        }});
 
         const densityTrace = {{
             x: d.charts.dens_x,
@@ -1019,20 +2072,769 @@ def generate_static_site():
             }}];
         }}
         
-        Plotly.newPlot('chart-dens', [densityTrace], densLayout, chartConfig);
+        const drawDens = drawChart('chart-dens', [densityTrace], densLayout);
+
+        // Recorded builds, one point per as-of time in the history store; not scenario-dependent
+        const tracePastTotal = {{
+            x: d.charts.past_x,
+            y: d.charts.past_total,
+            name: 'Active Doctors',
+            type: 'scatter',
+            mode: 'lines+markers',
+            connectgaps: false,
+            line: {{
+                width: 3,
+                color: '#667eea'
+            }},
+            hovertemplate: '<b>Active Doctors</b><br>Date: %{{x}}<br>Count: %{{y}}<extra></extra>'
+        }};
+
+        const tracePastRatio = {{
+            x: d.charts.past_x,
+            y: d.charts.past_ratio,
+            name: 'Junior/Veteran Ratio',
+            type: 'scatter',
+            mode: 'lines+markers',
+            yaxis: 'y2',
+            connectgaps: false,
+            line: {{
+                width: 2,
+                color: '#f39c12',
+                dash: 'dot'
+            }},
+            hovertemplate: '<b>Ratio</b><br>Date: %{{x}}<br>Ratio: %{{y}}<extra></extra>'
+        }};
+
+        const drawHistory = drawChart('chart-history', [tracePastTotal, tracePastRatio], {{
+            title: {{
+                text: 'Run-over-Run History: Active Doctors & Replacement Ratio',
+                font: {{ size: 18, family: 'Inter', weight: 600 }}
+            }},
+            margin: {{ t: 60, b: 60, l: 60, r: 80 }},
+            xaxis: {{
+                title: {{ text: 'Data As Of' }},
+                type: 'date',
+                gridcolor: '#f0f0f0'
+            }},
+            yaxis: {{
+                title: {{ text: 'Active Doctors' }},
+                gridcolor: '#f0f0f0'
+            }},
+            yaxis2: {{
+                title: {{ text: 'Junior/Veteran Ratio' }},
+                overlaying: 'y',
+                side: 'right',
+                showgrid: false
+            }},
+            legend: {{
+                x: 0.02,
+                y: 0.98,
+                bgcolor: 'rgba(255, 255, 255, 0.9)',
+                bordercolor: '#e2e8f0',
+                borderwidth: 1
+            }},
+            plot_bgcolor: '#fafafa',
+            paper_bgcolor: 'white',
+            hovermode: 'x unified'
+        }});
+        return Promise.all([drawJoins, drawTrend, drawExp, drawDens, drawHistory]);
+    }}
+
+    function init() {{
+        fillSelect();
+        buildScenarioControls();
+        if (specialties.length > 0) updateDashboard();
+        // The bubble map covers every specialty; draw it once the KPIs have painted and the browser is idle
+        const whenIdle = window.requestIdleCallback || (cb => setTimeout(cb, 1));
+        whenIdle(drawVelocityMap, {{ timeout: 2000 }});
+    }}
+
+    if (SHARDED) {{
+        fetch('{SHARD_DIR}/index.json')
+            .then(r => {{
+                if (!r.ok) throw new Error('Failed to load {SHARD_DIR}/index.json: HTTP ' + r.status);
+                return r.json();
+            }})
+            .then(index => {{
+                setup(index);
+                shardFiles = index.shards;
+                init();
+            }})
+            .catch(err => {{
+                console.error(err);
+                // Opening a sharded page from disk (file://) also lands here
+                showNotice('⚠️ The dashboard data could not be loaded. Reload the page to try again; '
+                    + 'this page must be served over HTTP.');
+            }});
+    }} else {{
+        setup(payload);
+        init();
     }}
-    
-    if (specialties.length > 0) updateDashboard();
 </script>
 
 </body>
 </html>
     """
 
-    with open("index.html", "w", encoding="utf-8") as f:
+    return html_content
+
+# --- STAGED PIPELINE ---
+# raw -> cleaned -> metrics -> site. Every stage output is persisted under
+# <cache-dir>/stages/, named by a hash of its inputs (upstream key + config +
+# the code that produces it), so a rerun only recomputes stages whose inputs moved.
+
+def fingerprint(*parts):
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+def code_fingerprint(*funcs):
+    return fingerprint(*[inspect.getsource(f) for f in funcs])
+
+def frame_fingerprint(df):
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return fingerprint(list(df.columns), hashlib.sha256(row_hashes.tobytes()).hexdigest())
+
+def cleaned_stage_key(raw_key):
+    normalization = normalization_table()
+    return fingerprint('cleaned', raw_key, COLUMN_MAP, CLEAN_COLUMNS, normalization["version"],
+                       normalization["variants"], SPELLING_TRANSLATION, CURRENT_YEAR, RETIREMENT_AGE_EXPERIENCE,
+                       code_fingerprint(clean_data, extract_years, canonical_spelling, compile_normalization,
+                                        normalize_specialties))
+
+def metrics_stage_key(cleaned_key, as_of):
+    return fingerprint('metrics', cleaned_key, as_of, AAMC_USA_BENCHMARKS, US_NEW_LICENSES, US_TOTAL_ACTIVE, US_MAPPING,
+                       ISRAEL_POPULATION, RETIREMENT_AGE_EXPERIENCE, CURRENT_YEAR, EXPERIENCE_BINS, EXPERIENCE_LABELS,
+                       MIN_ACTIVE_DOCTORS, HISTORY_START_YEAR, TREND_WINDOW_YEARS, FORECAST_YEARS,
+                       JUNIOR_MAX_EXPERIENCE, VETERAN_MIN_EXPERIENCE, SCENARIO_GRID,
+                       code_fingerprint(build_dashboard_data, dedup_masks, dedup_keys, compute_specialty_metrics,
+                                        specialty_codes, compute_trend_series, compute_scenario_grid))
+
+def stage_path(cache_dir, stage, key):
+    ext = STAGE_EXTENSIONS[stage]
+    return os.path.join(cache_dir, STAGES_DIR, f"{stage}-{key}.{ext}")
+
+def read_manifest(cache_dir):
+    path = os.path.join(cache_dir, STAGES_DIR, "manifest.json")
+    if not os.path.exists(path): return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def write_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, STAGES_DIR, "manifest.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def write_stage_artifact(cache_dir, stage, key, payload):
+    os.makedirs(os.path.join(cache_dir, STAGES_DIR), exist_ok=True)
+    path = stage_path(cache_dir, stage, key)
+    tmp_path = path + ".tmp"
+    if stage == 'cleaned':
+        # Uncompressed Arrow IPC file: readable later through a memory map
+        table = pa.Table.from_pandas(df=payload, preserve_index=False)
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, sort_keys=True, default=json_default)
+    os.replace(tmp_path, path)
+    # Only the newest artifact of a stage is kept around
+    prefix = os.path.join(cache_dir, STAGES_DIR, f"{stage}-")
+    for old in glob.glob(prefix + "*"):
+        if old != path: os.remove(old)
+
+def read_stage_artifact(cache_dir, stage, key):
+    path = stage_path(cache_dir, stage, key)
+    if not os.path.exists(path): return None
+    if stage == 'cleaned':
+        # Left open on purpose: zero-copy columns keep referencing the mapped file
+        source = pa.memory_map(path, "r")
+        return pa.ipc.open_file(source).read_all().to_pandas()
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# --- HISTORY STORE ---
+# Append-only record of every build, hive-partitioned by the data's as-of timestamp.
+# <history-dir>/metrics/as_of=.../ holds one row of KPIs per specialty; it is small
+# and committed with the site, so the trend survives a lost CI cache.
+# <cache-dir>/history/records/as_of=.../ holds only the cleaned records that appeared,
+# changed or (as tombstones) disappeared since the previous partition; it is bulky
+# (the first partition is a full copy) and stays in the cache. A partition is never
+# rewritten, so reruns on unchanged data add nothing.
+HISTORY_STAMP_FORMAT = "%Y-%m-%dT%H-%M-%S"  # sorts as text and is a valid path on every OS
+
+def history_stamp(as_of):
+    # CKAN's last_modified to the second, so two updates on one day stay two partitions.
+    # The year-only fallback is no modification time at all: None, and nothing is recorded.
+    try:
+        return datetime.datetime.fromisoformat(str(as_of).replace('Z', '+00:00')).strftime(HISTORY_STAMP_FORMAT)
+    except ValueError:
+        return None
+
+def history_partition_path(history_dir, table, stamp):
+    return os.path.join(history_dir, table, f"as_of={stamp}", "part-0.parquet")
+
+def write_history_partition(history_dir, table, stamp, df):
+    path = history_partition_path(history_dir, table, stamp)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path + ".tmp", index=False, compression="zstd")
+    os.replace(path + ".tmp", path)
+
+def metrics_history_frame(payload):
+    velocity = {v['name']: v['y'] for v in payload['velocity']}
+    return pd.DataFrame({
+        'specialty': list(payload['dashboard']),
+        'total_active': [d['total'] for d in payload['dashboard'].values()],
+        'replacement_ratio': [d['ratio_val'] for d in payload['dashboard'].values()],
+        'net_now': [d['net_now'] for d in payload['dashboard'].values()],
+        'velocity': [velocity[name] for name in payload['dashboard']],
+        'density': [d['charts']['dens_x'][0] for d in payload['dashboard'].values()],
+        'count_over_45': [d['count_over_45'] for d in payload['dashboard'].values()],
+    })[['specialty'] + HISTORY_KPIS]
+
+def history_records(df):
+    # One row per (licence, specialty), as the metrics count them
+    records = df[RECORD_KEY + RECORD_VALUES].drop_duplicates(RECORD_KEY)
+    return pd.DataFrame({
+        'license_num': records['license_num'].astype(str).to_numpy(),
+        'specialty_name': records['specialty_name'].astype(str).to_numpy(),
+        **{c: records[c].astype('Int16').to_numpy() for c in RECORD_VALUES},
+    })
+
+def read_history_records(history_dir):
+    # Replays the record deltas: the newest row per key, minus tombstoned keys
+    path = os.path.join(history_dir, 'records')
+    if not os.path.isdir(path): return history_records(pd.DataFrame(columns=RECORD_KEY + RECORD_VALUES))
+    df = pd.read_parquet(path)
+    df = df.sort_values('as_of', key=lambda d: d.astype(str), kind='stable').drop_duplicates(RECORD_KEY, keep='last')
+    return history_records(df[~df['deleted']])
+
+def record_delta(previous, current):
+    # Rows are matched on a hash of their key and compared on a hash of their values
+    prev_key = pd.util.hash_pandas_object(previous[RECORD_KEY], index=False).to_numpy()
+    cur_key = pd.util.hash_pandas_object(current[RECORD_KEY], index=False).to_numpy()
+    prev_val = pd.util.hash_pandas_object(previous[RECORD_VALUES], index=False).to_numpy()
+    cur_val = pd.util.hash_pandas_object(current[RECORD_VALUES], index=False).to_numpy()
+    match = pd.Index(prev_key).get_indexer(cur_key)
+    changed = match < 0
+    changed[~changed] = prev_val[match[~changed]] != cur_val[~changed]
+    gone = pd.Index(cur_key).get_indexer(prev_key) < 0
+    tombstones = previous.loc[gone, RECORD_KEY].assign(**{c: pd.NA for c in RECORD_VALUES})
+    delta = pd.concat([current[changed].assign(deleted=False), tombstones.assign(deleted=True)], ignore_index=True)
+    return delta.astype({c: 'Int16' for c in RECORD_VALUES})
+
+def update_history(args, manifest, payload):
+    # The metrics partition is written last: its presence marks the as-of time as recorded
+    history_dir, records_dir = args.history_dir, os.path.join(args.cache_dir, HISTORY_DIR)
+    stamp = history_stamp(payload.get('as_of'))
+    if stamp is None:
+        print(f"⚠️ History: data as of {payload.get('as_of')!r} has no modification time; not recorded")
+        return
+    if os.path.exists(history_partition_path(history_dir, 'metrics', stamp)):
+        print(f"🗂️ History: {stamp} already recorded in {history_dir}/")
+        return
+    cleaned = read_stage_artifact(args.cache_dir, 'cleaned', manifest.get('cleaned'))
+    if cleaned is None:
+        print(f"⚠️ History: no cleaned artifact, recording {stamp} metrics without record changes")
+    else:
+        delta = record_delta(read_history_records(records_dir), history_records(cleaned))
+        write_history_partition(records_dir, 'records', stamp, delta)
+        print(f"🗂️ History: {len(delta):,} records changed since the previous partition")
+    write_history_partition(history_dir, 'metrics', stamp, metrics_history_frame(payload))
+    print(f"🗂️ History: recorded {stamp} in {history_dir}/")
+
+def load_history_panel(history_dir=HISTORY_DIR, kpis=HISTORY_KPIS, specialties=None, since=None):
+    """Return the (as-of x specialty x KPI) panel of recorded metrics.
+
+    A frame indexed by as-of timestamp with (kpi, specialty) columns, so
+    panel['total_active'] is an as-of x specialty table. Only the requested KPI
+    columns, specialties and partitions from `since` (YYYY-MM-DD) on are read.
+    None when nothing is recorded.
+    """
+    path = os.path.join(history_dir, 'metrics')
+    if not os.path.isdir(path): return None
+    filters = [('specialty', 'in', list(specialties))] if specialties else []
+    if since: filters.append(('as_of', '>=', since))
+    df = pd.read_parquet(path, columns=['as_of', 'specialty', *kpis], filters=filters or None)
+    df['as_of'] = pd.to_datetime(df['as_of'].astype(str), format=HISTORY_STAMP_FORMAT)
+    return df.pivot(index='as_of', columns='specialty', values=list(kpis)).sort_index()
+
+def history_series(panel, names):
+    # What the history chart needs: the newest dates and, per chart KPI, one series per specialty
+    if panel is None or panel.empty: return None
+    panel = panel.tail(HISTORY_CHART_DATES)
+    series = {"dates": [d.strftime("%Y-%m-%d %H:%M:%S") for d in panel.index]}
+    for kpi, digits in HISTORY_CHART_KPIS.items():
+        table = panel[kpi].reindex(columns=names)
+        series[kpi] = [[None if pd.isna(v) else (int(v) if digits == 0 else round(float(v), digits))
+                        for v in table[name]] for name in names]
+    return series
+
+# --- RUN REPORT ---
+# Every stage runs inside stage_timer(), which appends one entry (wall/CPU time, peak
+# RSS, rows, fetch volume) to the run report written after each build. metrics pulls
+# cleaned from inside its own compute, so nested stage time is subtracted: each entry
+# is the stage's own cost.
+
+def new_run_report():
+    return {"started_at": datetime.datetime.now().isoformat(timespec="seconds"), "argv": sys.argv[1:],
+            "status": "failed", "stages": [], "_open": []}
+
+@contextlib.contextmanager
+def stage_timer(report, stage):
+    entry = {"stage": stage, "status": "computed"}
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    report["_open"].append([0.0, 0.0])
+    try:
+        yield entry
+    finally:
+        nested_wall, nested_cpu = report["_open"].pop()
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+        if report["_open"]:
+            report["_open"][-1][0] += wall
+            report["_open"][-1][1] += cpu
+        rss = peak_rss_mb()
+        entry.update(wall_s=round(wall - nested_wall, 4), cpu_s=round(cpu - nested_cpu, 4),
+                     peak_rss_mb=None if rss is None else round(rss, 1))
+        report["stages"].append(entry)
+
+def output_rows(result):
+    # Rows for frames, specialties for the metrics payload
+    if isinstance(result, pd.DataFrame): return len(result)
+    if isinstance(result, dict) and "dashboard" in result: return len(result["dashboard"])
+    return None
+
+def write_run_report(args, report):
+    report.pop("_open", None)
+    report["finished_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    # Stages are recorded as they finish; list them in pipeline order and chain rows_in
+    report["stages"].sort(key=lambda e: PIPELINE_STAGES.index(e["stage"]))
+    previous = None
+    for entry in report["stages"]:
+        if previous is not None and "rows_in" not in entry: entry["rows_in"] = previous.get("rows_out")
+        previous = entry
+    report["total"] = {
+        "wall_s": round(sum(e["wall_s"] for e in report["stages"]), 4),
+        "cpu_s": round(sum(e["cpu_s"] for e in report["stages"]), 4),
+        "peak_rss_mb": max((e["peak_rss_mb"] or 0 for e in report["stages"]), default=None),
+    }
+    path = args.report or os.path.join(args.cache_dir, RUN_REPORT_FILE)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    summary = " | ".join(f"{e['stage']} {e['wall_s']:.2f}s" for e in report["stages"])
+    print(f"⏱️ {summary} -> {path}")
+
+def run_stage(args, manifest, report, stage, key, compute):
+    # Reuse the artifact for this key unless the stage is forced by --from
+    forced = args.from_stage is not None and PIPELINE_STAGES.index(stage) >= PIPELINE_STAGES.index(args.from_stage)
+    with stage_timer(report, stage) as entry:
+        if not forced:
+            cached = read_stage_artifact(args.cache_dir, stage, key)
+            if cached is not None:
+                print(f"📦 {stage}: inputs unchanged, reusing {stage}-{key}")
+                entry.update(status="cached", rows_out=output_rows(cached))
+                return cached
+        result = compute()
+        if result is None:
+            entry["status"] = "failed"
+            return None
+        write_stage_artifact(args.cache_dir, stage, key, result)
+        entry["rows_out"] = output_rows(result)
+        manifest[stage] = key
+        write_manifest(args.cache_dir, manifest)
+        return result
+
+def upstream_key(manifest, stage):
+    key = manifest.get(stage)
+    if key is None:
+        print(f"❌ No {stage} artifact recorded yet; run the full pipeline once first")
+    return key
+
+# Everything that shapes the page bytes; part of the site/content hashes
+RENDER_FUNCS = (render_site, encode_payload, compact_record, shared_axes, encode_shards, write_shards,
+                write_plotly_bundle, history_series)
+
+def previous_content_hash(path):
+    if not os.path.exists(path): return None
+    with open(path, encoding="utf-8") as f:
+        head = f.read(4096)
+    match = re.search(r'<meta name="dashboard-content-hash" content="([0-9a-f]*)">', head)
+    return match.group(1) if match else None
+
+def generate_static_site(args=None):
+    args = args or parse_args([])
+    report = new_run_report()
+    try:
+        report["status"] = build_site(args, report) or "failed"
+    finally:
+        write_run_report(args, report)
+    return report
+
+def build_site(args, report):
+    manifest = read_manifest(args.cache_dir)
+    metrics = build_metrics(args, manifest, report)
+    if metrics is None: return
+    metrics_key, payload = metrics
+    with stage_timer(report, 'site') as entry:
+        return write_site(args, manifest, metrics_key, payload, entry)
+
+def build_metrics(args, manifest, report):
+    # raw -> cleaned -> metrics; returns (metrics key, metrics payload) or None
+    start = PIPELINE_STAGES.index(args.from_stage) if args.from_stage else 0
+    cleaned_key = metrics_key = None
+    raw = None
+
+    # Stages before --from are not rerun; their newest recorded artifact feeds the next one
+    if start <= PIPELINE_STAGES.index('cleaned'):
+        with stage_timer(report, 'raw') as entry:
+            if start == 0:
+                raw = ingest_raw_data(args, stats=entry)
+                if raw is None:
+                    entry["status"] = "failed"
+                    return
+                manifest['raw'] = frame_fingerprint(raw)
+            else:
+                entry["status"] = "cached"
+                if upstream_key(manifest, 'raw') is None: return
+                if read_snapshot_meta(args.cache_dir) is None:
+                    print(f"❌ No raw snapshot in {args.cache_dir}/ to rerun from")
+                    return
+                raw = read_snapshot(args.cache_dir)
+                # The snapshot is overwritten by every fetch; resume only from the one the manifest recorded
+                if frame_fingerprint(raw) != manifest['raw']:
+                    print(f"❌ The cached snapshot is not raw-{manifest['raw']} from the manifest; "
+                          "rerun without --from")
+                    entry["status"] = "failed"
+                    return
+                print(f"📦 raw: reusing cached snapshot raw-{manifest['raw']}")
+            manifest['as_of'] = raw.attrs.get('last_modified')
+            entry["rows_out"] = len(raw)
+        cleaned_key = cleaned_stage_key(manifest['raw'])
+    elif start == PIPELINE_STAGES.index('metrics'):
+        cleaned_key = upstream_key(manifest, 'cleaned')
+        if cleaned_key is None: return
+    else:
+        metrics_key = upstream_key(manifest, 'metrics')
+        if metrics_key is None: return
+
+    if metrics_key is None:
+        metrics_key = metrics_stage_key(cleaned_key, manifest.get('as_of'))
+        def compute_cleaned():
+            if raw is None:
+                print(f"❌ cleaned-{cleaned_key} is missing; rerun with --from cleaned")
+                return None
+            return clean_data(raw)
+        def compute_metrics():
+            df = run_stage(args, manifest, report, 'cleaned', cleaned_key, compute_cleaned)
+            if df is None: return None
+            dashboard_data, global_velocity_data = build_dashboard_data(df)
+            scenarios = compute_scenario_grid(df, list(dashboard_data))
+            # As-of date comes from the data: CKAN's last_modified, else the newest registration year
+            as_of = manifest.get('as_of') or str(int(df['gen_year'].max()))
+            return {"dashboard": dashboard_data, "velocity": global_velocity_data, "scenarios": scenarios,
+                    "as_of": as_of}
+        payload = run_stage(args, manifest, report, 'metrics', metrics_key, compute_metrics)
+    else:
+        with stage_timer(report, 'metrics') as entry:
+            payload = read_stage_artifact(args.cache_dir, 'metrics', metrics_key)
+            entry.update(status="cached", rows_out=output_rows(payload))
+    if payload is None: return
+    return metrics_key, payload
+
+def write_site(args, manifest, metrics_key, payload, entry):
+    history = None
+    if args.history:
+        update_history(args, manifest, payload)
+        panel = load_history_panel(args.history_dir, list(HISTORY_CHART_KPIS), list(payload["dashboard"]))
+        history = history_series(panel, list(payload["dashboard"]))
+    write_render_input(args.cache_dir, payload, history)
+
+    status = write_page(args, payload, history, entry)
+    if status == "written":
+        manifest['site'] = fingerprint('site', metrics_key, code_fingerprint(*RENDER_FUNCS))
+        write_manifest(args.cache_dir, manifest)
+    return status
+
+def write_render_input(cache_dir, payload, history):
+    # Everything the page is rendered from, so --render-from can redo just this step
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, RENDER_INPUT_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(dict(payload, history=history), f, ensure_ascii=False, sort_keys=True, default=json_default)
+    os.replace(path + ".tmp", path)
+
+def over_budget(args, page, plotly_name, plotly_js, shards):
+    # Every file the site serves gets a budget: the page, the vendored assets and each data shard
+    checks = [(os.path.basename(args.output), page, args.size_budget_kb),
+              (f"{ASSETS_DIR}/{plotly_name}", plotly_js, args.asset_budget_kb)]
+    checks += [(f"{SHARD_DIR}/{name}", blob, args.shard_budget_kb) for name, blob in shards.items()]
+    return [f"{name} is {len(blob) / 1024:.1f} KB, over the {budget} KB budget"
+            for name, blob, budget in checks if len(blob) / 1024 > budget]
+
+def write_page(args, payload, history, entry):
+    # Standard library only from here on: --render-from runs this without pandas, NumPy or pyarrow
+    plotly_bundle = load_plotly_bundle(args.plotly_bundle, args.cache_dir, args.offline)
+    if plotly_bundle is None:
+        entry["status"] = "failed"
+        return
+    plotly_name, plotly_js = plotly_bundle
+
+    if args.deterministic:
+        # Content address of the page: the metrics payload and its history plus the template that renders it
+        content_hash = fingerprint(payload_hash(payload), history, code_fingerprint(*RENDER_FUNCS), args.shards,
+                                   args.production, plotly_name)
+        if previous_content_hash(args.output) == content_hash:
+            print(f"✅ {args.output} already matches content hash {content_hash}; nothing to write.")
+            entry["status"] = "unchanged"
+            return "unchanged"
+        updated_label = f"data as of {format_as_of(payload.get('as_of'))}"
+    else:
+        content_hash, updated_label = "", TIMESTAMP
+
+    payload_size_report(payload["dashboard"], payload["velocity"], payload["scenarios"])
+    html_content = render_site(payload["dashboard"], payload["scenarios"], updated_label, content_hash, args.shards,
+                               f"{ASSETS_DIR}/{plotly_name}", history)
+    shards = encode_shards(payload["dashboard"], payload["scenarios"], history) if args.shards else {}
+    if args.production:
+        if brotli is None:
+            entry["status"] = "failed"
+            sys.exit("❌ brotli is not installed; a --production build needs it for the .br siblings "
+                     "(pip install -r requirements.txt)")
+        full_size = len(html_content.encode("utf-8"))
+        html_content = minify_html(html_content)
+        print(f"🗜️ Minified page: {full_size / 1024:.1f} KB -> {len(html_content.encode('utf-8')) / 1024:.1f} KB")
+        # Checked before anything is written, so an over-budget build leaves the last good site in place
+        over = over_budget(args, html_content.encode("utf-8"), plotly_name, plotly_js, shards)
+        if over:
+            entry["status"] = "over budget"
+            sys.exit("❌ Over the size budget:\n" + "\n".join(f"   {line}" for line in over))
+
+    out_dir = os.path.dirname(os.path.abspath(args.output))
+    write_plotly_bundle(plotly_name, plotly_js, out_dir, compress=args.production)
+    if args.shards:
+        write_shards(shards, out_dir, compress=args.production)
+    with open(args.output, "w", encoding="utf-8") as f:
         f.write(html_content)
-    
+    entry["bytes_out"] = len(html_content.encode("utf-8"))
+    if args.production:
+        precompress(args.output)
+
     print("✅ Success! Enhanced dashboard created with modern design.")
+    return "written"
+
+def render_from(args):
+    # Fast path: re-render the page from a saved render input (or a bare metrics stage
+    # artifact, which has no history) without running or importing the data pipeline
+    report = new_run_report()
+    try:
+        with stage_timer(report, 'site') as entry:
+            with open(args.render_from, encoding="utf-8") as f:
+                payload = json.load(f)
+            history = payload.pop("history", None)
+            report["status"] = write_page(args, payload, history if args.history else None, entry) or "failed"
+    finally:
+        write_run_report(args, report)
+    return report
+
+def profile_run(args):
+    # Whole-run cProfile: raw stats for snakeviz/pstats plus the top entries inline
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(generate_static_site, args)
+    finally:
+        profiler.dump_stats(args.profile)
+        print(f"\n🔬 Profile written to {args.profile}; top functions by cumulative time:")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+# --- QUERY SERVICE ---
+# --serve keeps the cleaned frame and the metrics payload in memory and answers
+# JSON queries over them, so other tools stop scraping index.html:
+#
+#   GET /api/meta                          as-of date, metrics version, row counts
+#   GET /api/specialties                   names with their active-doctor totals
+#   GET /api/specialties/<name>            the specialty's KPIs
+#   GET /api/specialties/<name>/series     its yearly series (joins, net trend, forecast, pie, density)
+#   GET /api/velocity                      the velocity map points
+#
+# Every response body is encoded once per metrics version and served from memory
+# with a content ETag; If-None-Match gets a 304. A background thread reruns the
+# staged pipeline every --refresh-minutes and swaps in the new state (and an empty
+# response cache) only when the metrics key moved.
+
+class MetricsService:
+    def __init__(self, args):
+        self.args = args
+        self.state = None
+        self.refresh_lock = threading.Lock()
+
+    def refresh(self):
+        with self.refresh_lock:
+            manifest = read_manifest(self.args.cache_dir)
+            metrics = build_metrics(self.args, manifest, new_run_report())
+            if metrics is None: return False
+            metrics_key, payload = metrics
+            if self.state is not None and self.state["version"] == metrics_key: return False
+            cleaned = read_stage_artifact(self.args.cache_dir, 'cleaned', manifest.get('cleaned'))
+            # One assignment, so a request sees either the old state or the new one
+            self.state = {"version": metrics_key, "payload": payload, "cleaned": cleaned, "responses": {}}
+            print(f"🔄 Serving metrics {metrics_key} (data as of {format_as_of(payload.get('as_of'))})")
+            return True
+
+    def route(self, state, path):
+        payload = state["payload"]
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if parts[0] != "api": return None
+        if parts[1:] == ["meta"]:
+            return {"as_of": payload.get("as_of"), "version": state["version"], "specialties": len(payload["dashboard"]),
+                    "cleaned_rows": None if state["cleaned"] is None else len(state["cleaned"])}
+        if parts[1:] == ["specialties"]:
+            return [{"name": name, "total": d["total"]} for name, d in payload["dashboard"].items()]
+        if parts[1:] == ["velocity"]:
+            return payload["velocity"]
+        if len(parts) in (3, 4) and parts[1] == "specialties" and parts[2] in payload["dashboard"]:
+            entry = payload["dashboard"][parts[2]]
+            if len(parts) == 3:
+                return dict({k: v for k, v in entry.items() if k != "charts"}, name=parts[2])
+            if parts[3] == "series":
+                return entry["charts"]
+        return None
+
+    def response(self, path):
+        # (status, etag, body); bodies are cached per state, so a refresh invalidates them all at once
+        state = self.state
+        cached = state["responses"].get(path)
+        if cached is None:
+            body = self.route(state, path)
+            if body is None:
+                return 404, None, json.dumps({"error": f"no such resource: {path}"}).encode("utf-8")
+            blob = json.dumps(body, ensure_ascii=False, default=json_default).encode("utf-8")
+            cached = state["responses"][path] = ('"' + hashlib.sha256(blob).hexdigest()[:16] + '"', blob)
+        return (200,) + cached
+
+def etag_matches(header, etag):
+    if header is None: return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+def make_service_handler(service):
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            status, etag, body = service.response(urlparse(self.path).path)
+            if etag is not None and etag_matches(self.headers.get("If-None-Match"), etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if etag is not None:
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+def refresh_periodically(service, stop):
+    while not stop.wait(service.args.refresh_minutes * 60):
+        try:
+            service.refresh()
+        except Exception as e:
+            # Keep answering from the last good state; the next tick tries again
+            print(f"⚠️ Refresh failed, still serving {service.state['version']}: {e}")
+
+def serve(args):
+    from http.server import ThreadingHTTPServer
+    service = MetricsService(args)
+    if not service.refresh():
+        sys.exit("❌ Could not compute the metrics to serve")
+    stop = threading.Event()
+    if args.refresh_minutes > 0:
+        threading.Thread(target=refresh_periodically, args=(service, stop), daemon=True).start()
+    server = ThreadingHTTPServer((args.host, args.port), make_service_handler(service))
+    server.daemon_threads = True
+    print(f"🛰️ Serving the metrics API on http://{args.host}:{args.port}/api/specialties")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Israel medical workforce dashboard (index.html).")
+    parser.add_argument("--api-url", default=API_URL,
+                        help="CKAN datastore_search endpoint (point at a local fake server for testing)")
+    parser.add_argument("--concurrency", type=int, default=FETCH_CONCURRENCY,
+                        help=f"number of pages fetched in parallel (default: {FETCH_CONCURRENCY}); "
+                             "1 restores the original one-page-at-a-time walk")
+    parser.add_argument("--retries", type=int, default=FETCH_RETRIES,
+                        help="retries per request on 5xx responses, dropped connections and timeouts")
+    parser.add_argument("--page-limit", type=int, default=PAGE_LIMIT,
+                        help="rows requested per datastore_search page")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="directory holding the raw snapshot and its CKAN metadata")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false",
+                        help="always download the full dataset and leave the snapshot untouched")
+    parser.add_argument("--offline", action="store_true",
+                        help="build entirely from the cached snapshot without touching the network")
+    parser.add_argument("--incremental", action="store_true",
+                        help="fetch only rows past the cached snapshot's highest _id and merge them in")
+    parser.add_argument("--from", dest="from_stage", choices=PIPELINE_STAGES,
+                        help="rerun this stage and everything after it, reusing the newest artifacts before it")
+    parser.add_argument("--output", default="index.html", help="path of the generated dashboard page")
+    parser.add_argument("--shards", action="store_true",
+                        help=f"write one JSON shard per specialty into {SHARD_DIR}/ next to the page and load them "
+                             "on demand instead of inlining every chart series (needs to be served over HTTP)")
+    parser.add_argument("--plotly-bundle",
+                        help=f"local plotly.js bundle to vendor into assets/ instead of the pinned partial build "
+                             f"(plotly-basic {PLOTLY_VERSION}); it must register only scatter, bar and pie traces")
+    parser.add_argument("--production", action="store_true",
+                        help="minify the page, write .gz/.br siblings of every asset and enforce --size-budget-kb")
+    parser.add_argument("--size-budget-kb", type=float, default=PAGE_SIZE_BUDGET_KB,
+                        help="fail a --production build when the minified page exceeds this many KB")
+    parser.add_argument("--asset-budget-kb", type=float, default=ASSET_SIZE_BUDGET_KB,
+                        help="fail a --production build when a vendored asset (the plotly.js bundle) exceeds this many KB")
+    parser.add_argument("--shard-budget-kb", type=float, default=SHARD_SIZE_BUDGET_KB,
+                        help="fail a --production build when a data shard or the shard index exceeds this many KB")
+    parser.add_argument("--history-dir", default=HISTORY_DIR,
+                        help="append-only store of every build's per-specialty KPIs, partitioned by the data's "
+                             "as-of time and committed with the site; feeds the history chart (the bulkier "
+                             f"record changes go to <cache-dir>/{HISTORY_DIR})")
+    parser.add_argument("--no-history", dest="history", action="store_false",
+                        help="neither record this build in --history-dir nor draw the history chart")
+    parser.add_argument("--report",
+                        help=f"where to write the JSON run report (default: <cache-dir>/{RUN_REPORT_FILE})")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="profile the whole run with cProfile and dump pstats data to PATH")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="stamp the page with the data's as-of date and a content hash, and skip writing "
+                             "when the hash matches the existing page")
+    parser.add_argument("--render-from", metavar="PATH",
+                        help=f"only re-render the page from saved metrics (<cache-dir>/{RENDER_INPUT_FILE}, written "
+                             "by every build, or a metrics stage artifact) using just the standard library")
+    parser.add_argument("--serve", action="store_true",
+                        help="instead of writing the page, serve the metrics as a JSON API (see /api/specialties)")
+    parser.add_argument("--host", default="127.0.0.1", help="address --serve binds to")
+    parser.add_argument("--port", type=int, default=8000, help="port --serve listens on")
+    parser.add_argument("--refresh-minutes", type=float, default=60,
+                        help="how often --serve reruns the pipeline to pick up new data (0 = never)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    generate_static_site()
+    args = parse_args()
+    if args.serve: serve(args)
+    elif args.render_from: render_from(args)
+    elif args.profile: profile_run(args)
+    else: generate_static_site(args)
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import argparse
+import datetime
+
+from make_static_site import CURRENT_YEAR, US_MAPPING, normalization_table, write_snapshot
+
+# Synthetic licence records shaped like the Ministry of Health datastore resource:
+# the same Hebrew column names, the date formats extract_years() accepts (and the
+# junk it rejects), a skewed specialty mix and doctors appearing once per specialty.
+
+RAW_COLUMNS = ['_id', 'שם פרטי', 'שם משפחה', 'מספר רישיון', 'תאריך רישום רישיון', 'שם התמחות', 'תאריך רישום התמחות']
+FIRST_NAMES = ['יוסי', 'דוד', 'מיכל', 'נועה', 'אברהם', 'שרה', 'משה', 'רחל', 'אחמד', 'מרים', 'איתי', 'תמר']
+LAST_NAMES = ['כהן', 'לוי', 'מזרחי', 'פרץ', 'ביטון', 'דהן', 'אברהם', 'פרידמן', 'חדד', 'עזרא', 'כץ', 'שפירא']
+# Share of the rows written in each date format; the last three are rejected by the cleaner
+DATE_FORMATS = {'dd/mm/yyyy': 0.70, 'dd.mm.yyyy': 0.08, 'yyyy': 0.08, 'yyyy.0': 0.06,
+                'iso': 0.03, 'blank': 0.03, 'nan': 0.02}
+NO_SPECIALTY_SHARE = 0.35      # licensed doctors without a recognised specialty
+SECOND_SPECIALTY_SHARE = 0.12  # specialists holding a second (sub)specialty
+REPEATED_ROW_SHARE = 0.02      # rows the datastore serves twice
+
+def specialty_mix():
+    # Canonical names plus the spelling variants specialty_normalization.json folds together,
+    # weighted Zipf-style so a few large specialties dominate like the real data
+    names = list(US_MAPPING) + [n for n in normalization_table()["variants"] if n not in US_MAPPING]
+    weights = 1.0 / np.arange(1, len(names) + 1) ** 0.9
+    return np.array(names, dtype=object), weights / weights.sum()
+
+def format_dates(rng, years):
+    # Build each distinct (year, month, day, format) string once and index into them,
+    # which keeps 10M-row frames cheap to generate
+    n = len(years)
+    months = rng.integers(1, 13, n)
+    days = rng.integers(1, 29, n)
+    formats = rng.choice(len(DATE_FORMATS), n, p=list(DATE_FORMATS.values()))
+    keys = ((years.astype(np.int64) * 100 + months) * 100 + days) * 10 + formats
+    codes, uniques = pd.factorize(keys)
+    names = list(DATE_FORMATS)
+    strings = []
+    for key in uniques:
+        fmt, key = names[key % 10], key // 10
+        y, m, d = key // 10000, key // 100 % 100, key % 100
+        strings.append({'dd/mm/yyyy': f"{d:02d}/{m:02d}/{y}", 'dd.mm.yyyy': f"{d:02d}.{m:02d}.{y}",
+                        'yyyy': str(y), 'yyyy.0': f"{y}.0", 'iso': f"{y}-{m:02d}-{d:02d}",
+                        'blank': " ", 'nan': "nan"}[fmt])
+    return np.array(strings, dtype=object)[codes]
+
+def generate_records(n_rows, seed=0):
+    """Return n_rows raw records as the datastore serves them (every field a string, _id an int)."""
+    rng = np.random.default_rng(seed)
+    n_doctors = max(1, int(n_rows / (1 + SECOND_SPECIALTY_SHARE * (1 - NO_SPECIALTY_SHARE) + REPEATED_ROW_SHARE)))
+
+    # One row per doctor, then extra rows for second specialties; an extra row that
+    # draws the doctor's existing specialty again is a repeated record
+    doctor = np.arange(n_doctors)
+    extra = rng.choice(n_doctors, n_rows - n_doctors, replace=True) if n_rows > n_doctors else np.array([], dtype=np.int64)
+    rows = np.concatenate([doctor, extra])
+    rng.shuffle(rows)
+
+    # Licensing ramps up over the decades; a doctor's first specialty follows 5-12 years later
+    license_year = np.clip(np.rint(CURRENT_YEAR - rng.gamma(2.2, 9.0, n_doctors)), 1950, CURRENT_YEAR).astype(np.int64)
+    spec_year = license_year[rows] + rng.integers(5, 13, len(rows))
+    names, weights = specialty_mix()
+    specialty = names[rng.choice(len(names), len(rows), p=weights)]
+    no_specialty = (rng.random(len(rows)) < NO_SPECIALTY_SHARE) | (spec_year > CURRENT_YEAR)
+    specialty[no_specialty] = ""
+
+    license_num = pd.Series(rng.permutation(np.arange(10_000, 10_000 + 3 * n_doctors))[:n_doctors]).astype(str).to_numpy()
+    spec_dates = format_dates(rng, np.minimum(spec_year, CURRENT_YEAR))
+    spec_dates[no_specialty] = None
+    df = pd.DataFrame({
+        '_id': np.arange(1, len(rows) + 1, dtype=np.int64),
+        'שם פרטי': np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), len(rows))],
+        'שם משפחה': np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), len(rows))],
+        'מספר רישיון': license_num[rows],
+        'תאריך רישום רישיון': format_dates(rng, license_year)[rows],
+        'שם התמחות': specialty,
+        'תאריך רישום התמחות': spec_dates,
+    })
+    return df[RAW_COLUMNS]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic doctor licence records with the datastore schema.")
+    parser.add_argument("--rows", type=int, default=100_000, help="number of records to generate")
+    parser.add_argument("--seed", type=int, default=0, help="random seed; the same seed gives the same records")
+    parser.add_argument("--cache-dir", default=".cache-synthetic",
+                        help="write the records as a raw snapshot here, ready for make_static_site.py --offline --cache-dir")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    df = generate_records(args.rows, args.seed)
+    write_snapshot(df, {"last_modified": datetime.datetime(CURRENT_YEAR, 1, 1).isoformat(), "total": len(df),
+                        "synthetic_seed": args.seed}, args.cache_dir)
+    print(f"✅ Wrote {len(df):,} synthetic records to {args.cache_dir}/")
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from make_static_site import CURRENT_YEAR, extract_years
+
+def get_year_simple(val):
+    # The original per-value parser, kept as the reference extract_years() must match
+    s = str(val).strip()
+    if s.endswith('.0'): s = s[:-2]
+    if not s or s.lower() in ['nan', 'none', '', 'nat']:
+        return np.nan
+    if len(s) >= 4:
+        potential_year = s[-4:]
+        if potential_year.isdigit():
+            y = int(potential_year)
+            if 1900 <= y <= CURRENT_YEAR + 1:
+                return y
+    return np.nan
+
+DATE_STRINGS = [
+    # dd/mm/yyyy and dd.mm.yyyy, as the datastore mostly serves them
+    "15/03/2001", "1/1/1990", "31.12.1975", " 07/08/2012 ", "\t01/01/2000\n",
+    # ISO dates and timestamps: the year is not at the end, so they are rejected
+    "2001-03-15", "2001-03-15T00:00:00", "2001-03-15 00:00:00",
+    # bare years, also as the float-formatted strings a numeric column leaves behind
+    "1999", "1999.0", "1999.0.0", " 2005.0 ", "0199", "19999",
+    # missing-value spellings
+    "", " ", "nan", "NaN", "None", "none", "NaT", "nat", "nan.0",
+    # junk
+    "abcd", "unknown", "12/12/20", "2020abc", "year 2020", "--2020", "20-20", "٢٠٠٥", "15/03/٢٠٠٥",
+    # range edges
+    "1899", "01/01/1899", "1900", "01/01/1900", str(CURRENT_YEAR), str(CURRENT_YEAR + 1),
+    str(CURRENT_YEAR + 2), f"01/01/{CURRENT_YEAR + 2}", "9999",
+]
+
+@pytest.mark.parametrize("values", [
+    pd.Series(DATE_STRINGS, dtype=object),
+    pd.Series(DATE_STRINGS + [None, np.nan, pd.NaT, None], dtype=object),
+    pd.Series([1999, 2005.0, np.nan, 1850, CURRENT_YEAR + 1, None, "01/02/1988"], dtype=object),
+    pd.Series([1999.0, np.nan, 1800.0, 2010.5, float(CURRENT_YEAR)]),
+    pd.Series([2001, 1899, CURRENT_YEAR + 2]),
+    pd.Series(["15/03/2001", None, "15/03/2001", "nan", "15/03/2001"] * 3, index=range(10, 25)),
+    pd.Series([], dtype=object),
+])
+def test_extract_years_matches_get_year_simple(values):
+    expected = values.map(get_year_simple).astype(float)
+    result = extract_years(values)
+    assert result.index.equals(values.index)
+    np.testing.assert_array_equal(result.to_numpy(dtype=float), expected.to_numpy())
+
+def test_extract_years_examples():
+    values = pd.Series(["15/03/2001", "1999.0", "2001-03-15", "nan", None, "1899", str(CURRENT_YEAR + 1)])
+    np.testing.assert_array_equal(extract_years(values).to_numpy(),
+                                  [2001, 1999, np.nan, np.nan, np.nan, np.nan, CURRENT_YEAR + 1])
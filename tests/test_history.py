@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+
+import make_static_site as site
+
+@pytest.mark.parametrize("as_of, stamp", [
+    ("2026-03-01T06:30:15.123456", "2026-03-01T06-30-15"),
+    ("2026-03-01T06:30:15Z", "2026-03-01T06-30-15"),
+    ("2026-03-01", "2026-03-01T00-00-00"),
+    ("2025", None),    # the newest-registration-year fallback is no modification time
+    (None, None),
+])
+def test_history_stamp(as_of, stamp):
+    assert site.history_stamp(as_of) == stamp
+
+def test_same_day_updates_stay_separate(tmp_path):
+    for as_of, total in [("2026-03-01T06:00:00", 10), ("2026-03-01T18:00:00", 12), ("2026-03-02T06:00:00", 13)]:
+        frame = pd.DataFrame({'specialty': ['A'], **{k: [total] for k in site.HISTORY_KPIS}})
+        site.write_history_partition(str(tmp_path), 'metrics', site.history_stamp(as_of), frame)
+    panel = site.load_history_panel(str(tmp_path), list(site.HISTORY_CHART_KPIS))
+    assert panel['total_active']['A'].tolist() == [10, 12, 13]
+    assert site.history_series(panel, ['A'])["dates"] == [
+        "2026-03-01 06:00:00", "2026-03-01 18:00:00", "2026-03-02 06:00:00"]
+    since = site.load_history_panel(str(tmp_path), ['total_active'], since="2026-03-02")
+    assert since['total_active']['A'].tolist() == [13]
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+import make_static_site as site
+
+API_URL = "http://datastore.test/api/3/action/datastore_search"
+FIELDS = ['_id', 'מספר רישיון', 'שם התמחות', 'תאריך רישום התמחות']
+
+def record(i):
+    return {'_id': i, 'מספר רישיון': str(1000 + i), 'שם התמחות': 'קרדיולוגיה', 'תאריך רישום התמחות': '01/01/2000'}
+
+class FakeResponse:
+    def __init__(self, body): self.body = body
+    def raise_for_status(self): pass
+    def json(self): return self.body
+
+class FakeSession:
+    # Just enough of datastore_search and resource_show, over records sorted on _id
+    def __init__(self, records, last_modified):
+        self.records, self.last_modified = sorted(records, key=lambda r: r['_id']), last_modified
+    def get(self, url, params, timeout):
+        if url.endswith("resource_show"): return FakeResponse({"success": True, "result": {"last_modified": self.last_modified}})
+        offset, limit = int(params["offset"]), int(params["limit"])
+        return FakeResponse({"success": True, "result": {
+            "fields": [{"id": f} for f in FIELDS], "total": len(self.records),
+            "records": self.records[offset:offset + limit]}})
+    def close(self): pass
+
+def load(tmp_path, monkeypatch, records, last_modified, *flags):
+    monkeypatch.setattr(site, "make_session", lambda *a, **k: FakeSession(records, last_modified))
+    args = site.parse_args(["--api-url", API_URL, "--cache-dir", str(tmp_path), "--page-limit", "3",
+                            "--concurrency", "2", *flags])
+    return site.load_raw_data(args)
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    # A full refresh of _id 1..10 seeds the snapshot
+    df = load(tmp_path, monkeypatch, [record(i) for i in range(1, 11)], "2026-01-01T00:00:00")
+    assert len(df) == 10
+    return tmp_path
+
+def test_appended_rows_are_fetched_incrementally(snapshot, monkeypatch, capsys):
+    upstream = [record(i) for i in range(1, 15)]
+    df = load(snapshot, monkeypatch, upstream, "2026-01-02T00:00:00", "--incremental")
+    assert "Incremental" in capsys.readouterr().out
+    assert df['_id'].tolist() == list(range(1, 15))
+
+def test_deletions_before_the_cached_offset_force_a_full_refresh(snapshot, monkeypatch, capsys):
+    # Two rows deleted and four appended: the total still grows, but offset 10 now holds
+    # _id 13, so an offset-based delta would silently skip _id 11 and 12
+    upstream = [record(i) for i in range(1, 15) if i not in (3, 4)]
+    df = load(snapshot, monkeypatch, upstream, "2026-01-02T00:00:00", "--incremental")
+    assert "Full refresh: rows before _id 10 were deleted" in capsys.readouterr().out
+    assert df['_id'].tolist() == [r['_id'] for r in upstream]
+
+def test_incremental_and_full_refresh_agree(snapshot, monkeypatch, tmp_path_factory):
+    # _id 11 re-serves the licence/specialty of _id 2 past the cached boundary: the newer row wins
+    upstream = [record(i) for i in range(1, 11)] + [dict(record(2), _id=11), record(12)]
+    incremental = load(snapshot, monkeypatch, upstream, "2026-01-02T00:00:00", "--incremental")
+    full = load(tmp_path_factory.mktemp("full"), monkeypatch, upstream, "2026-01-02T00:00:00")
+    pd.testing.assert_frame_equal(incremental, full)
+    assert incremental['_id'].tolist() == [1, *range(3, 13)]
+    assert site.read_snapshot(str(snapshot))['_id'].tolist() == [1, *range(3, 13)]
+
+class FlakySession(FakeSession):
+    # Fails the page at one offset, or serves it short while still reporting the full total
+    def __init__(self, records, fail_at=None, short_at=None):
+        super().__init__(records, "2026-01-01T00:00:00")
+        self.fail_at, self.short_at = fail_at, short_at
+    def get(self, url, params, timeout):
+        response = super().get(url, params, timeout)
+        if int(params["offset"]) == self.fail_at: response.body = {"success": False}
+        elif int(params["offset"]) == self.short_at: response.body["result"]["records"] = response.body["result"]["records"][:1]
+        return response
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+@pytest.mark.parametrize("flaw, message", [
+    ({"fail_at": 6}, "page at offset 6 came back unsuccessful"),
+    ({"short_at": 3}, "fetched 8 rows from offset 0, expected 10"),
+])
+def test_both_walks_reject_failed_and_short_pages(concurrency, flaw, message):
+    session = FlakySession([record(i) for i in range(1, 11)], **flaw)
+    with pytest.raises(RuntimeError, match=message):
+        site.fetch_dataset(API_URL, concurrency, 3, session)
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_both_walks_stop_at_the_total(concurrency):
+    # 9 rows over pages of 3: the walk must not treat the empty page at offset 9 as a failure
+    df = site.fetch_dataset(API_URL, concurrency, 3, FakeSession([record(i) for i in range(1, 10)], None))
+    assert df['_id'].tolist() == list(range(1, 10))
+
+def test_snapshot_keeps_the_fetched_fingerprint(snapshot, monkeypatch):
+    # --from cleaned resumes only when the snapshot hashes to the raw key the fetch recorded
+    fetched = load(snapshot, monkeypatch, [record(i) for i in range(1, 13)], "2026-01-02T00:00:00", "--incremental")
+    assert site.frame_fingerprint(site.read_snapshot(str(snapshot))) == site.frame_fingerprint(fetched)
@@ -0,0 +1,36 @@
+import os
+import urllib.request
+
+import pytest
+
+import make_static_site as site
+
+NAME = os.path.basename(site.PLOTLY_BUNDLE_URL)
+
+def bundle(*traces):
+    head = f"/*! plotly.js (basic - minified) v{site.PLOTLY_VERSION} */\n"
+    return (head + "".join(f'{{moduleType:"trace",name:"{t}"}};' for t in traces)).encode()
+
+@pytest.fixture
+def no_network(monkeypatch):
+    def urlopen(*args, **kwargs): raise AssertionError("the bundle must not be downloaded")
+    monkeypatch.setattr(urllib.request, "urlopen", urlopen)
+
+def test_offline_never_downloads(tmp_path, monkeypatch, no_network, capsys):
+    monkeypatch.setattr(site, "VENDOR_DIR", str(tmp_path / "vendor"))
+    assert site.load_plotly_bundle(cache_dir=str(tmp_path / "cache"), offline=True) is None
+    assert "pass --plotly-bundle" in capsys.readouterr().out
+
+@pytest.mark.parametrize("where", ["vendor", "cache"])
+def test_local_copies_are_used_without_the_network(tmp_path, monkeypatch, no_network, where):
+    monkeypatch.setattr(site, "VENDOR_DIR", str(tmp_path / "vendor"))
+    folder = tmp_path / "vendor" if where == "vendor" else tmp_path / "cache" / "vendor"
+    folder.mkdir(parents=True)
+    (folder / NAME).write_bytes(bundle("scatter", "bar", "pie"))
+    name, js = site.load_plotly_bundle(cache_dir=str(tmp_path / "cache"), offline=True)
+    assert name.startswith("plotly-") and js == bundle("scatter", "bar", "pie")
+
+def test_full_bundles_are_refused(tmp_path):
+    path = tmp_path / "plotly.min.js"
+    path.write_bytes(bundle("scatter", "bar", "pie", "heatmap", "sankey"))
+    assert site.load_plotly_bundle(str(path)) is None
@@ -0,0 +1,69 @@
+import contextlib
+import io
+
+import pandas as pd
+import pytest
+
+import make_static_site as site
+from synthetic_data import RAW_COLUMNS, generate_records
+
+@pytest.fixture(scope="module")
+def built():
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = site.clean_data(generate_records(30_000, seed=7))
+        dashboard, velocity = site.build_dashboard_data(df)
+        return dashboard, velocity, site.compute_scenario_grid(df, list(dashboard))
+
+def default_cell(scenarios, name, i):
+    # What the page's kpi() reads with every slider at its default
+    kpi = scenarios["kpis"][name]
+    value = kpi["values"][i]
+    for axis in kpi["axes"]: value = value[scenarios["defaults"][axis]]
+    return value
+
+def test_default_cell_matches_the_single_scenario_metrics(built):
+    dashboard, velocity, scenarios = built
+    assert len(dashboard) > 10
+    d_retire, d_window = scenarios["defaults"]["retire"], scenarios["defaults"]["window"]
+    for i, (spec, d) in enumerate(dashboard.items()):
+        cell = lambda name: default_cell(scenarios, name, i)
+        charts = d["charts"]
+        assert cell("total") == d["total"], spec
+        assert cell("net_now") == d["net_now"], spec
+        assert cell("ratio") == d["ratio_val"], spec
+        assert site.RATIO_COLORS[cell("ratio_color")] == d["ratio_color"], spec
+        assert cell("count_over_45") == d["count_over_45"], spec
+        assert cell("pie") == charts["pie_values"], spec
+        assert cell("velocity") == round(velocity[i]["y"], 2), spec
+        assert cell("density") == round(charts["dens_x"][0], 5), spec
+        assert cell("y1_max") == round(charts["y1_range"][1], 2), spec
+        if charts["usa_bench"]:
+            assert site.GAP_COLORS[cell("gap_color")] == d["usa_color"], spec
+            assert str(abs(cell("gap"))) in d["usa_text"], spec
+        assert scenarios["series"]["hist"][i][d_retire][d_window] == charts["hist_y"], spec
+        assert scenarios["series"]["fut"][i][d_retire][d_window] == charts["fut_y"], spec
+
+def test_count_over_45_ignores_the_retirement_slider(built):
+    assert built[2]["kpis"]["count_over_45"]["axes"] == []
+
+def test_replacement_ratio_rounds_like_python():
+    # 1/40 and 1/8 are half-way cells where np.round() and round() disagree or tie
+    ratios = site.replacement_ratio([[1, 1], [3, 5]], [[40, 8], [0, 4]])
+    assert ratios.tolist() == [[round(1 / 40, 2), round(1 / 8, 2)], [99.9, 1.25]]
+    assert ratios[0, 0] == 0.03
+
+def test_half_way_ratio_agrees_between_grid_and_metrics():
+    # One junior (5 years in) over 40 veterans (32 years in) in a single specialty
+    years = [site.CURRENT_YEAR - 5] + [site.CURRENT_YEAR - 32] * 40
+    raw = pd.DataFrame({
+        '_id': range(1, len(years) + 1), 'שם פרטי': 'א', 'שם משפחה': 'ב',
+        'מספר רישיון': [str(1000 + i) for i in range(len(years))],
+        'תאריך רישום רישיון': [f"01/01/{y}" for y in years],
+        'שם התמחות': 'קרדיולוגיה', 'תאריך רישום התמחות': [f"01/01/{y}" for y in years],
+    })[RAW_COLUMNS]
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = site.clean_data(raw)
+        dashboard, _ = site.build_dashboard_data(df)
+        scenarios = site.compute_scenario_grid(df, list(dashboard))
+    (d,) = dashboard.values()
+    assert d["ratio_val"] == default_cell(scenarios, "ratio", 0) == 0.03
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from make_static_site import (CURRENT_YEAR, FORECAST_YEARS, HISTORY_START_YEAR, RETIREMENT_AGE_EXPERIENCE,
+                              TREND_WINDOW_YEARS, compute_trend_series)
+
+# Intended semantics, for every history year y in HISTORY_START_YEAR..CURRENT_YEAR:
+#   joins(y)   = specialty registrations in y
+#   inflow(y)  = registrations in the trailing window (y - 8, y]
+#   outflow(y) = retirements (registration year + 45) in the same window (y - 8, y]
+#   net(y)     = inflow(y) - outflow(y)
+# and for every forecast year f in CURRENT_YEAR+1..CURRENT_YEAR+4:
+#   fut(f) = registrations in [f - 8, CURRENT_YEAR]
+#          + (f - CURRENT_YEAR) * max(1, registrations in CURRENT_YEAR-5..CURRENT_YEAR-1 // 5)
+#          - retirements in (f - 8, f]
+
+SPECIALTIES = ['A', 'B', 'F']
+HISTORY = list(range(HISTORY_START_YEAR, CURRENT_YEAR + 1))
+CY = CURRENT_YEAR
+
+def frame(rows):
+    # rows: (specialty, registration year or None, counted as a first occurrence)
+    spec = pd.Categorical([r[0] for r in rows], categories=['A', 'B', 'C', 'F'])
+    years = pd.array([r[1] for r in rows], dtype='Int16')
+    df = pd.DataFrame({'specialty_name': spec, 'spec_year': years})
+    df['retirement_year_spec'] = df['spec_year'] + RETIREMENT_AGE_EXPERIENCE
+    return df, np.array([r[2] for r in rows])
+
+ROWS = [
+    ('A', 1990, True), ('A', 1990, True),
+    ('A', 1990, False),              # repeated record: not a first occurrence, never counted
+    ('A', 1997, True),
+    ('A', 1940, True),               # retires in 1985
+    ('A', None, True),               # no registration year
+    ('C', 2000, True),               # specialty outside the list
+    *[('F', CY - 3, True)] * 10,     # 10 recent registrations: forecast inflow 2/year
+    ('F', CY - 7, True), ('F', CY, True),
+    ('F', CY - 44, True),            # retires next year
+    ('F', CY - 41, True),            # retires in the last forecast year
+]
+
+def series(values):
+    # {year: value} -> the history-year series, zero elsewhere
+    return [values.get(y, 0) for y in HISTORY]
+
+def result():
+    df, first = frame(ROWS)
+    return compute_trend_series(df, first, SPECIALTIES)
+
+def test_window_constants():
+    assert TREND_WINDOW_YEARS == 8 and FORECAST_YEARS == 4 and RETIREMENT_AGE_EXPERIENCE == 45
+
+def test_joins():
+    joins = result()['joins']
+    assert joins[0].tolist() == series({1990: 2, 1997: 1})
+    assert joins[1].tolist() == series({})
+
+def test_history_inflow_outflow_net():
+    hist = result()['hist']
+    # Inflow: 1990's two registrations count in 1990..1997 and drop out in 1998; 1997's counts in 1997..2004
+    inflow = {**{y: 2 for y in range(1990, 1997)}, 1997: 3, **{y: 1 for y in range(1998, 2005)}}
+    # Outflow: the 1985 retirement counts in 1985..1992 (not 1984, not 1993); 1990's two retire
+    # in 2035 and 1997's in 2042, inside the history only once CURRENT_YEAR gets there
+    outflow = {**{y: 1 for y in range(1985, 1993)}, **{y: 2 for y in range(2035, 2042)},
+               **{y: 3 for y in range(2042, 2043)}, **{y: 1 for y in range(2043, 2050)}}
+    assert hist[0].tolist() == [i - o for i, o in zip(series(inflow), series(outflow))]
+    assert hist[0][HISTORY.index(1984)] == 0 and hist[0][HISTORY.index(1985)] == -1
+    assert hist[0][HISTORY.index(1992)] == 2 - 1 and hist[0][HISTORY.index(1993)] == 2
+
+def test_forecast():
+    out = result()
+    assert out['avg_inflow'].tolist() == [1, 1, 2]
+    # Registrations in [f-8, CY]: 12 for CY+1 (CY-7, 10 x CY-3, CY), 11 once CY-7 leaves the window;
+    # projected inflow 2/year; retirements in (f-8, f]: CY+1 from the first year, CY+4 in the last
+    assert out['fut'][2].tolist() == [12 + 2 - 1, 11 + 4 - 1, 11 + 6 - 1, 11 + 8 - 2]
+
+def test_specialty_without_data():
+    out = result()
+    assert out['hist'][1].tolist() == [0] * len(HISTORY)
+    # Only the projected inflow floor of one registration per year
+    assert out['fut'][1].tolist() == [1, 2, 3, 4]
+
+def test_no_rows():
+    df, first = frame([])
+    out = compute_trend_series(df, first.astype(bool), SPECIALTIES)
+    assert out['joins'].shape == (3, len(HISTORY))
+    assert not out['hist'].any()
+    assert out['fut'].tolist() == [[1, 2, 3, 4]] * 3